@@ -0,0 +1,300 @@
+"""
+Module: benchmark_pipeline.py
+
+This module benchmarks the DataProcessor pipeline on synthetic client and financial datasets.
+
+Functions:
+    - generate_datasets: Generate synthetic client and financial CSV datasets.
+    - get_peak_driver_memory: Get the peak memory of the Python and JVM driver processes so far.
+    - run_stage: Run and measure one benchmark stage.
+    - run_benchmark: Run all stages for one dataset scale.
+    - compare_reports: Compare a report against a baseline report.
+    - main: Main entry point for the script.
+
+Usage:
+    python benchmark/benchmark_pipeline.py --scales 1e5 1e6 --country_skew 0.8 --id_overlap 0.9
+
+Example:
+    python benchmark/benchmark_pipeline.py --scales 1e5 --baseline benchmark/reports/baseline.json
+"""
+
+import os
+import sys
+import argparse
+import json
+import time
+from datetime import datetime, timezone
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+from pyspark.sql.functions import col, concat, element_at, array, floor, lit, rand, when  # noqa: E402
+from src.pyspark_app.data_processor import DataProcessor  # noqa: E402
+
+COUNTRIES = ["United Kingdom", "Netherlands", "France", "United States", "Germany", "Poland"]
+CARD_TYPES = ["visa", "mastercard", "jcb", "amex", "maestro"]
+
+COMPARED_PARAMETERS = ("country_skew", "id_overlap", "countries", "profile")
+
+
+def generate_datasets(spark, rows, country_skew, id_overlap, output_dir):
+    """
+    Generate synthetic client and financial CSV datasets.
+
+    Args:
+        spark (SparkSession): The Spark session.
+        rows (int): The number of rows of each dataset.
+        country_skew (float): The share of clients in the United Kingdom; the rest is spread evenly.
+        id_overlap (float): The share of financial rows whose id matches a client.
+        output_dir (str): The directory the datasets are written to.
+
+    The directory names include the scale, skew and overlap, so datasets generated with
+    other parameters are never reused.
+
+    Returns:
+        tuple: The paths of the clients and financials datasets.
+    """
+    clients_path = os.path.join(output_dir, f"clients_{rows}_skew{country_skew}")
+    financials_path = os.path.join(output_dir, f"financials_{rows}_overlap{id_overlap}")
+    countries = array(*[lit(country) for country in COUNTRIES[1:]])
+    card_types = array(*[lit(card_type) for card_type in CARD_TYPES])
+
+    if not os.path.exists(clients_path):
+        (
+            spark.range(1, rows + 1)
+            .select(
+                col("id").cast("int").alias("id"),
+                concat(lit("first_"), col("id")).alias("first_name"),
+                concat(lit("last_"), col("id")).alias("last_name"),
+                concat(lit("client"), col("id"), lit("@example.com")).alias("email"),
+                when(rand(seed=1) < country_skew, lit(COUNTRIES[0]))
+                .otherwise(element_at(countries, (floor(rand(seed=2) * (len(COUNTRIES) - 1)) + 1).cast("int")))
+                .alias("country"),
+            )
+            .write.csv(clients_path, header=True)
+        )
+
+    if not os.path.exists(financials_path):
+        (
+            spark.range(1, rows + 1)
+            .select(
+                when(rand(seed=3) < id_overlap, col("id")).otherwise(col("id") + rows).cast("int").alias("id"),
+                concat(lit("1btc"), col("id")).alias("btc_a"),
+                element_at(card_types, (floor(rand(seed=4) * len(CARD_TYPES)) + 1).cast("int")).alias("cc_t"),
+                (lit(4000000000000000) + col("id")).alias("cc_n"),
+            )
+            .write.csv(financials_path, header=True)
+        )
+
+    return clients_path, financials_path
+
+
+def get_peak_driver_memory(processor):
+    """
+    Get the peak memory of the Python and JVM driver processes so far.
+
+    Both peaks cover the whole process since it started, not a single scale: every scale
+    after the first reports at least the peak of the scales before it. Run one scale per
+    process to measure the peak of each scale.
+
+    Args:
+        processor (DataProcessor): The DataProcessor under test.
+
+    Returns:
+        dict: The process-wide peak resident memory of the Python driver and peak JVM heap, in bytes.
+    """
+    peak_memory = {"python_process_max_rss_bytes": None, "jvm_process_peak_heap_bytes": None}
+    if resource is not None:
+        peak_memory["python_process_max_rss_bytes"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+    for executor in processor.fetch_status_json("allexecutors") or []:
+        if executor.get("id") == "driver":
+            peak_memory["jvm_process_peak_heap_bytes"] = executor.get("peakMemoryMetrics", {}).get("JVMHeapMemory")
+    return peak_memory
+
+
+def run_stage(processor, stage_name, stage_function):
+    """
+    Run and measure one benchmark stage.
+
+    Data persisted by the stage is released afterwards, so no stage reuses the cache of a previous one.
+
+    Args:
+        processor (DataProcessor): The DataProcessor under test.
+        stage_name (str): The name of the stage, also used as the Spark job group.
+        stage_function (callable): Runs the stage, including the action that materializes it.
+
+    Returns:
+        dict: The wall time and Spark metrics of the stage.
+    """
+    spark_context = processor.create_spark_session().sparkContext
+    job_group = f"benchmark-{stage_name}-{time.time_ns()}"
+    spark_context.setJobGroup(job_group, stage_name)
+    start_time = time.perf_counter()
+    stage_function()
+    wall_time = time.perf_counter() - start_time
+    spark_context.setLocalProperty("spark.jobGroup.id", None)
+    processor.release_persisted_data()
+
+    stage_result = {"wall_time_seconds": round(wall_time, 3)}
+    stage_result.update(processor.collect_stage_metrics(job_group) or {})
+    return stage_result
+
+
+def run_benchmark(processor, clients_path, financials_path, countries, output_dir):
+    """
+    Run all stages for one dataset scale.
+
+    Every stage is materialized with a no-op write, so its time includes the stages it depends on.
+    The end-to-end stage runs process_data, the same code path as the command line.
+
+    Args:
+        processor (DataProcessor): The DataProcessor under test.
+        clients_path (str): The path of the clients dataset.
+        financials_path (str): The path of the financials dataset.
+        countries (list): List of countries to filter.
+        output_dir (str): The directory the end-to-end output is written to.
+
+    Returns:
+        dict: The results per stage and end to end.
+    """
+    selection_config = processor.load_column_selection_config()
+
+    def read_clients():
+        return processor.read_csv_file(clients_path, "Clients", selection_config['clients_columns'], "clients", countries)
+
+    def read_financials():
+        return processor.read_csv_file(financials_path, "Financials", selection_config['financials_columns'], "financials")
+
+    def join():
+        return processor.join_datasets(read_clients(), read_financials())
+
+    def rename():
+        return processor.rename_columns(join())
+
+    def materialize(build_df):
+        return lambda: build_df().write.format("noop").mode("overwrite").save()
+
+    results = {"stages": {}}
+    for stage_name, build_df in (("read_clients", read_clients), ("read_financials", read_financials),
+                                 ("join_datasets", join), ("rename_columns", rename)):
+        results["stages"][stage_name] = run_stage(processor, stage_name, materialize(build_df))
+
+    processor.stage_observations = {}
+    output_path = os.path.join(output_dir, "result_data")
+    results["end_to_end"] = run_stage(
+        processor, "end_to_end", lambda: processor.process_data(clients_path, financials_path, countries, output_path)
+    )
+    results["peak_driver_memory"] = get_peak_driver_memory(processor)
+    return results
+
+
+def compare_reports(report, baseline_report, tolerance):
+    """
+    Compare a report against a baseline report.
+
+    Runs are matched on their number of rows, which is only meaningful when both reports
+    were generated with the same dataset and Spark parameters.
+
+    Args:
+        report (dict): The current report.
+        baseline_report (dict): The baseline report.
+        tolerance (float): The allowed relative increase of wall time, e.g. 0.1 for 10%.
+
+    Returns:
+        list: A description of every stage whose wall time regressed beyond the tolerance.
+
+    Raises:
+        ValueError: If a parameter of the report differs from the baseline.
+    """
+    for parameter in COMPARED_PARAMETERS:
+        if report.get(parameter) != baseline_report.get(parameter):
+            raise ValueError(
+                f"{parameter} is {report.get(parameter)!r}, but {baseline_report.get(parameter)!r} in the baseline"
+            )
+
+    baseline_runs = {run["rows"]: run for run in baseline_report.get("runs", [])}
+    regressions = []
+    for run in report["runs"]:
+        baseline_run = baseline_runs.get(run["rows"])
+        if baseline_run is None:
+            continue
+        stages = dict(run["stages"], end_to_end=run["end_to_end"])
+        baseline_stages = dict(baseline_run["stages"], end_to_end=baseline_run["end_to_end"])
+        for stage_name, stage_result in stages.items():
+            baseline_time = baseline_stages.get(stage_name, {}).get("wall_time_seconds")
+            if baseline_time and stage_result["wall_time_seconds"] > baseline_time * (1 + tolerance):
+                regressions.append(
+                    f"{run['rows']} rows - {stage_name}: {stage_result['wall_time_seconds']}s (baseline {baseline_time}s)"
+                )
+    return regressions
+
+
+def main():
+    """
+    Main entry point for the script.
+
+    Generates the datasets, runs the benchmark for every scale, writes the JSON report
+    and exits with a non-zero status if a stage regressed against the baseline, or if
+    the baseline was generated with other parameters.
+    """
+    parser = argparse.ArgumentParser(description="Benchmark the DataProcessor pipeline.")
+    parser.add_argument("--scales", nargs='+', type=float, default=[1e5], help="Number of rows per dataset, e.g. 1e5 1e6")
+    parser.add_argument("--country_skew", type=float, default=0.8, help="Share of clients in the United Kingdom")
+    parser.add_argument("--id_overlap", type=float, default=0.9, help="Share of financial ids matching a client")
+    parser.add_argument("--countries", nargs='+', default=["United Kingdom", "Netherlands"], help="List of countries to filter")
+    parser.add_argument("--data_dir", default=os.path.join(PROJECT_ROOT, "benchmark", "data"), help="Directory of the generated datasets")
+    parser.add_argument("--report", default=None, help="Path of the JSON report")
+    parser.add_argument("--baseline", default=None, help="Baseline JSON report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="Allowed relative wall time increase against the baseline")
+    parser.add_argument("--profile", default=None, help="Spark performance profile")
+    args = parser.parse_args()
+
+    processor = DataProcessor(lazy=True, profile=args.profile, engine="spark")
+    spark = processor.create_spark_session("DataProcessorBenchmark")
+
+    report = {
+        "generated_at": datetime.now(timezone.utc).isoformat(),
+        "spark_version": spark.version,
+        "profile": args.profile,
+        "country_skew": args.country_skew,
+        "id_overlap": args.id_overlap,
+        "countries": args.countries,
+        "runs": [],
+    }
+    for scale in args.scales:
+        rows = int(scale)
+        clients_path, financials_path = generate_datasets(spark, rows, args.country_skew, args.id_overlap, args.data_dir)
+        run_result = run_benchmark(processor, clients_path, financials_path, args.countries, os.path.join(args.data_dir, f"output_{rows}"))
+        run_result["rows"] = rows
+        report["runs"].append(run_result)
+
+    report_path = args.report or os.path.join(
+        PROJECT_ROOT, "benchmark", "reports", f"benchmark_{datetime.now(timezone.utc).strftime('%Y%m%d_%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(report_path), exist_ok=True)
+    with open(report_path, 'w') as report_file:
+        json.dump(report, report_file, indent=2)
+    print(f"Benchmark report written to {report_path}")
+
+    if args.baseline:
+        with open(args.baseline, 'r') as baseline_file:
+            baseline_report = json.load(baseline_file)
+        try:
+            regressions = compare_reports(report, baseline_report, args.tolerance)
+        except ValueError as comparison_error:
+            print(f"Cannot compare against the baseline: {comparison_error}")
+            sys.exit(2)
+        for regression in regressions:
+            print(f"Regression: {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,3 @@
 # pyspark_assignment/src/pyspark_app/__init__.py
 
 # Initialization code for the pyspark_app package
-print("pyspark_app package is being initialized.")
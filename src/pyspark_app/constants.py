@@ -0,0 +1,18 @@
+"""
+Module: constants.py
+
+This module defines the constants shared by the command-line entry point (main.py) and the
+DataProcessor (data_processor.py).
+
+It imports nothing but the standard library, so main.py can use it without importing PySpark.
+
+Constants:
+    - DEFAULT_OUTPUT_PATH: The default output directory.
+    - SUPPORTED_ENGINES: The execution engines selectable with --engine.
+"""
+
+import os
+
+DEFAULT_OUTPUT_PATH = os.path.join("client_data", "result_data")
+
+SUPPORTED_ENGINES = ('auto', 'spark', 'local')
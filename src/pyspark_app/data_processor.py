@@ -0,0 +1,3336 @@
+"""
+Module: data_processor.py
+
+This module defines a DataProcessor class responsible for processing client and financial data using PySpark.
+
+Classes:
+    - DataProcessor: Main class for processing data.
+    - JobRequestHandler: HTTP handler of the job server.
+
+Functions:
+    - instrumented_stage: Decorator recording wall time and Spark metrics of a pipeline stage.
+    - get_project_root: Get the root directory of the project.
+    - get_config_path: Get the absolute path to a configuration file.
+    - get_logs_path: Get the absolute path to a log file.
+    - validate_config_value: Validate a configuration value against its schema.
+    - load_config: Load, validate and cache a configuration file.
+    - load_all_configs: Load and validate all pipeline configuration files.
+    - load_column_selection_config: Load column selection configuration from YAML file.
+    - load_schema_registry_config: Load the dataset schema registry from YAML file.
+    - build_schema: Build a StructType for a dataset registered in the schema registry.
+    - get_schema_cache_path: Get the path of the cached inferred schema for a file.
+    - infer_schema: Infer a CSV schema by sampling and cache it on disk.
+    - track_row_count: Count the rows of a stage eagerly or register a lazy observation.
+    - log_stage_row_counts: Log the row counts collected by observations.
+    - build_country_filter: Build the country filter condition.
+    - filter_data: Filter data based on specified conditions.
+    - load_column_rename_config: Load column renaming configuration from YAML file.
+    - get_config_version: Get the version of a configuration file from its modification time.
+    - get_renamed_columns: Map column names to their names after all configured renames.
+    - get_rename_plan: Compute the kept columns and their new names after renames, drops and ordering.
+    - build_rename_projection: Compile the renames, dropped columns and column order into one projection.
+    - rename_columns: Rename columns in the DataFrame based on the configuration file.
+    - get_renamed_column: Get the output name of a column after renaming.
+    - compute_output_columns: Compute the selected input columns that reach the output.
+    - get_pruned_join_columns: Select the columns of the join inputs that are needed by the join or the output.
+    - prune_join_inputs: Prune the join inputs to the join key and the columns that reach the output.
+    - load_join_config: Load join strategy configuration from YAML file.
+    - estimate_size_in_bytes: Estimate the size of a DataFrame from its optimized plan.
+    - find_hot_keys: Find join keys that hold a large share of the rows.
+    - choose_join_strategy: Choose the join strategy for the client and financial datasets.
+    - join_with_salted_keys: Sort-merge join that spreads hot keys over salted partitions.
+    - set_session_conf: Set a Spark SQL setting for the current run.
+    - restore_session_conf: Restore the Spark SQL settings changed by set_session_conf.
+    - apply_runtime_filter: Prune the financials to the ids of the filtered clients before the join.
+    - load_persistence_config: Load intermediate persistence configuration from YAML file.
+    - persist_stage: Persist or checkpoint the DataFrame of a stage according to the persistence policy.
+    - get_cached_rdd_id: Get the id of the RDD holding the cached data of a persisted DataFrame.
+    - log_cached_sizes: Log the memory and disk size of the DataFrames persisted by this run.
+    - release_persisted_data: Unpersist the persisted DataFrames of the run.
+    - join_datasets: Join client and financial datasets without explicit column renaming.
+    - load_partitioning_config: Load skew-aware partitioning configuration from YAML file.
+    - repartition_skew_aware: Repartition a DataFrame by country, salting hot countries.
+    - load_spark_profiles_config: Load Spark performance profiles from YAML file.
+    - create_spark_session: Create the Spark session of the DataProcessor from a performance profile.
+    - setup_logging: Set up logging configuration based on a YAML file.
+    - get_input_format: Get the input format of a file from its extension.
+    - load_staging_config: Load columnar staging configuration from YAML file.
+    - get_staging_key: Compute the staging key of a raw input file.
+    - stage_csv_file: Convert a raw CSV file to a staged Parquet copy, reusing an existing one.
+    - evict_staged_files: Evict least recently used staged copies above the size limit.
+    - scan_directory: List the data files and subdirectories of a single directory.
+    - list_directory_files: Recursively list the data files of a directory with parallel scans.
+    - match_glob: Match a path against a glob pattern one path component at a time.
+    - list_input_files: List the files of a directory or glob through the cached file index.
+    - resolve_input_paths: Resolve a file, glob, directory or manifest to the input files.
+    - plan_input_splits: Size the Spark input splits from the total input size.
+    - read_csv_file: Read a CSV file into a Spark DataFrame and select specific columns.
+    - load_ingestion_config: Load input ingestion configuration from YAML file.
+    - read_sources_in_parallel: Read several input sources concurrently.
+    - load_writer_config: Load output writer configuration from YAML file.
+    - get_max_records_per_file: Estimate the records per output file for a target file size.
+    - get_staging_path: Get a staging directory next to an output path, unique to the call.
+    - delete_path: Recursively delete a path if it exists.
+    - commit_output: Atomically move a staged output directory into place.
+    - is_local_path: Check whether a path is on the local file system.
+    - estimate_output_size: Estimate the size of the output of the run.
+    - export_on_driver: Export a small DataFrame on the driver from streamed Arrow record batches.
+    - save_to_file: Save DataFrame with the distributed output writer.
+    - load_incremental_config: Load incremental processing configuration from YAML file.
+    - hash_rows_by_id: Compute a content hash per id of a DataFrame.
+    - path_exists: Check whether a path exists, on any file system supported by Hadoop.
+    - get_incremental_state_path: Get the state directory of an incremental output.
+    - read_incremental_state: Read the per-id hashes of the previous incremental run.
+    - read_existing_output: Read a previously written output dataset.
+    - process_data_incremental: Process only new or changed ids and merge them into the existing output.
+    - process_data: Process client and financial data and perform filtering, joining, and renaming.
+    - load_fan_out_config: Load country group fan-out configuration from YAML file.
+    - process_data_fan_out: Process several country groups with a single read, join and write.
+    - load_engine_config: Load execution engine configuration from YAML file.
+    - get_local_engine_blocker: Find the reason the local engine cannot run a job.
+    - choose_engine: Choose the execution engine of a job.
+    - parse_local_value: Parse a CSV field like Spark's CSV reader for a registry type.
+    - format_local_csv_value: Format a value like Spark's CSV writer with its default options.
+    - read_csv_local: Read, filter and select the columns of a CSV input with the csv module.
+    - run_local_stage: Run and record one stage of the local engine.
+    - commit_local_output: Atomically move a staged local output directory into place.
+    - write_csv_local: Write rows as a single CSV part file like Spark's CSV writer.
+    - process_data_local: Process client and financial data on the driver without a Spark session.
+    - load_streaming_config: Load streaming configuration from YAML file.
+    - read_csv_stream: Read new CSV files of a directory as a stream.
+    - get_streaming_checkpoint_path: Get the default checkpoint directory of a streaming query.
+    - process_data_streaming: Continuously process new client and financial files with a stream-stream join.
+    - load_server_config: Load job server configuration from YAML file.
+    - get_output_lock: Get the lock serializing the jobs of the job server that write the same output.
+    - run_job: Run one job of the job server with a fresh DataProcessor.
+    - submit_job: Validate a job request and queue it on the job server.
+    - evict_finished_jobs: Remove finished jobs from the job server once they expire or exceed the maximum count.
+    - create_job_server: Create the HTTP job server around a warm Spark session.
+    - serve: Run the job server until interrupted.
+    - fetch_status_json: Fetch a JSON document from the Spark status REST API.
+    - collect_stage_metrics: Collect the Spark job, stage, row, byte, shuffle and spill metrics of a job group.
+    - record_stage_metrics: Store the metrics of a stage and append them to the metrics JSON lines file.
+    - get_metrics_path: Get the path of the stage metrics JSON lines file.
+    - log_metrics_summary: Log a summary table of the metrics of all stages.
+    - run: Run the pipeline selected by the parsed command-line arguments.
+    - main: Parse the command-line arguments and run the selected pipeline.
+
+Usage:
+    - Instantiate DataProcessor class and call process_data or main, or run with the arguments parsed by main.py.
+
+Example:
+    processor = DataProcessor()
+    processor.process_data("raw_data/dataset_one.csv", "raw_data/dataset_two.csv", ["Netherlands"])
+"""
+
+import os
+import csv
+import fnmatch
+import functools
+import hashlib
+import importlib
+import math
+import inspect
+import json
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import urllib.error
+import urllib.request
+import uuid
+from datetime import datetime, timezone
+from urllib.parse import urlparse
+import logging
+from logging.handlers import RotatingFileHandler
+import time
+import yaml
+from pyspark import StorageLevel
+from pyspark.sql import SparkSession
+from pyspark.sql.utils import AnalysisException
+from pyspark.sql import DataFrame
+from pyspark.sql import Observation
+from pyspark.sql.functions import (
+    approx_count_distinct, array, broadcast, coalesce, col, collect_list, concat_ws, count, countDistinct, current_timestamp,
+    explode, expr, floor, lit, pmod, rand, sha2, sort_array, when, xxhash64
+)
+from pyspark.sql.types import (
+    StructType, StructField, StringType, IntegerType, LongType,
+    DoubleType, BooleanType, DateType, TimestampType
+)
+
+if __package__:
+    from .constants import DEFAULT_OUTPUT_PATH, SUPPORTED_ENGINES
+else:
+    from constants import DEFAULT_OUTPUT_PATH, SUPPORTED_ENGINES
+
+SUPPORTED_OUTPUT_FORMATS = ('parquet', 'orc', 'csv')
+
+INCREMENTAL_STATE_INFO_FILE = '_state_info.json'
+
+GLOB_CHARACTERS = ('*', '?', '[')
+
+MANIFEST_EXTENSION = '.manifest'
+
+COLUMNAR_INPUT_EXTENSIONS = {
+    '.parquet': 'parquet',
+    '.orc': 'orc',
+}
+
+LOCAL_ENGINE_INTEGER_RANGES = {
+    'integer': (-2 ** 31, 2 ** 31 - 1),
+    'long': (-2 ** 63, 2 ** 63 - 1),
+}
+
+CSV_WRITER_TRIM_CHARACTERS = ''.join(chr(code) for code in range(33))
+
+PERSISTENCE_POLICIES = ('none', 'MEMORY_AND_DISK', 'DISK_ONLY', 'checkpoint')
+
+CHECKPOINT_DIR_LOCK = threading.Lock()
+
+STAGE_METRIC_FIELDS = (
+    'inputRecords', 'inputBytes', 'outputRecords', 'outputBytes',
+    'shuffleReadBytes', 'shuffleWriteBytes', 'memoryBytesSpilled', 'diskBytesSpilled',
+)
+
+SCHEMA_TYPE_MAPPING = {
+    'string': StringType,
+    'integer': IntegerType,
+    'long': LongType,
+    'double': DoubleType,
+    'boolean': BooleanType,
+    'date': DateType,
+    'timestamp': TimestampType,
+}
+
+def instrumented_stage(stage_name, label_argument=None):
+    """
+    Decorator recording wall time and Spark metrics of a pipeline stage.
+
+    The jobs started by the stage are tagged with their own Spark job group, whose
+    metrics are collected once the stage returns. Stages called while another job
+    group is active (e.g. from the benchmark) only record their wall time.
+
+    Args:
+        stage_name (str): The name of the stage.
+        label_argument (str): Name of an argument of the method used to label the stage.
+
+    Returns:
+        callable: The decorator.
+    """
+    def decorator(method):
+        signature = inspect.signature(method)
+
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            label = None
+            if label_argument:
+                label = signature.bind(self, *args, **kwargs).arguments.get(label_argument)
+
+            spark_context = self.create_spark_session().sparkContext
+            outer_job_group = spark_context.getLocalProperty("spark.jobGroup.id")
+            job_group = None
+            if not outer_job_group:
+                job_group = f"{stage_name}-{uuid.uuid4().hex}"
+                spark_context.setJobGroup(job_group, label or stage_name)
+
+            started_at = datetime.now(timezone.utc).isoformat()
+            start_time = time.perf_counter()
+            try:
+                return method(self, *args, **kwargs)
+            finally:
+                wall_time = time.perf_counter() - start_time
+                if job_group:
+                    spark_context.setLocalProperty("spark.jobGroup.id", None)
+                    spark_context.setLocalProperty("spark.job.description", None)
+                self.record_stage_metrics(stage_name, label, started_at, wall_time, job_group)
+        return wrapper
+    return decorator
+
+CONFIG_COLUMN_LIST = {'type': list, 'items': {'type': str}}
+CONFIG_NUMBER = {'type': (int, float)}
+
+CONFIG_SCHEMAS = {
+    'logging_config.yaml': {
+        'logs_formatter': {'type': str, 'required': True},
+        'time_formatter': {'type': str, 'required': True},
+        'file_handler': {'type': dict, 'fields': {
+            'mode': {'type': str, 'choices': ('a', 'w')},
+            'max_bytes': {'type': int},
+            'backup_count': {'type': int},
+        }},
+        'metrics_file': {'type': str},
+        'metrics_timeout_seconds': CONFIG_NUMBER,
+    },
+    'column_selection_config.yaml': {
+        'clients_columns': dict(CONFIG_COLUMN_LIST, required=True),
+        'financials_columns': dict(CONFIG_COLUMN_LIST, required=True),
+    },
+    'column_rename_config.yaml': {
+        'renamed_columns': {'type': list, 'required': True, 'items': {'type': dict, 'fields': {
+            'original_name': {'type': str, 'required': True},
+            'new_name': {'type': str, 'required': True},
+        }}},
+        'dropped_columns': CONFIG_COLUMN_LIST,
+        'column_order': CONFIG_COLUMN_LIST,
+    },
+    'schema_registry_config.yaml': {
+        'datasets': {'type': dict, 'required': True, 'values': {'type': list, 'items': {'type': dict, 'fields': {
+            'name': {'type': str, 'required': True},
+            'type': {'type': str, 'choices': tuple(SCHEMA_TYPE_MAPPING)},
+            'nullable': {'type': bool},
+        }}}},
+        'inference': {'type': dict, 'fields': {
+            'sampling_ratio': CONFIG_NUMBER,
+            'cache_dir': {'type': str},
+        }},
+    },
+    'writer_config.yaml': {
+        'output_format': {'type': str, 'choices': SUPPORTED_OUTPUT_FORMATS},
+        'partition_by': CONFIG_COLUMN_LIST,
+        'compression': {'type': str},
+        'target_file_size_mb': CONFIG_NUMBER,
+        'csv_options': {'type': dict},
+        'driver_export': {'type': dict, 'fields': {
+            'enabled': {'type': bool},
+            'max_bytes': {'type': int},
+            'chunk_rows': {'type': int},
+        }},
+    },
+    'join_config.yaml': {
+        'broadcast_threshold_mb': CONFIG_NUMBER,
+        'skew': {'type': dict, 'fields': {
+            'enabled': {'type': bool},
+            'sample_fraction': CONFIG_NUMBER,
+            'hot_key_min_share': CONFIG_NUMBER,
+            'salt_buckets': {'type': int},
+        }},
+        'runtime_filter': {'type': dict, 'fields': {
+            'enabled': {'type': bool},
+            'max_id_set_size': {'type': int},
+            'false_positive_rate': CONFIG_NUMBER,
+            'min_application_side_mb': CONFIG_NUMBER,
+            'expected_ids': {'type': int},
+        }},
+    },
+    'persistence_config.yaml': {
+        'filtered_data': {'type': str, 'choices': PERSISTENCE_POLICIES},
+        'joined_data': {'type': str, 'choices': PERSISTENCE_POLICIES},
+        'checkpoint_dir': {'type': str},
+    },
+    'fan_out_config.yaml': {
+        'group_column': {'type': str, 'required': True},
+        'groups': {'type': dict, 'values': CONFIG_COLUMN_LIST},
+    },
+    'server_config.yaml': {
+        'host': {'type': str, 'required': True},
+        'port': {'type': int, 'required': True},
+        'max_concurrent_jobs': {'type': int},
+        'max_queued_jobs': {'type': int},
+        'max_finished_jobs': {'type': int},
+        'finished_job_ttl_seconds': CONFIG_NUMBER,
+    },
+    'ingestion_config.yaml': {
+        'max_concurrency': {'type': int},
+        'scheduler_pool': {'type': str},
+        'listing_threads': {'type': int},
+        'file_index_dir': {'type': str},
+        'min_split_mb': CONFIG_NUMBER,
+        'max_split_mb': CONFIG_NUMBER,
+    },
+    'partitioning_config.yaml': {
+        'enabled': {'type': bool},
+        'partition_column': {'type': str},
+        'key_column': {'type': str},
+        'sample_fraction': CONFIG_NUMBER,
+        'hot_key_min_share': CONFIG_NUMBER,
+        'target_partition_mb': CONFIG_NUMBER,
+        'max_salt_buckets': {'type': int},
+    },
+    'staging_config.yaml': {
+        'enabled': {'type': bool},
+        'staging_dir': {'type': str},
+        'max_staged_bytes': {'type': int},
+        'hash_chunk_bytes': {'type': int},
+        'min_idle_seconds': CONFIG_NUMBER,
+    },
+    'incremental_config.yaml': {
+        'state_dir': {'type': str},
+        'hash_separator': {'type': str},
+    },
+    'engine_config.yaml': {
+        'engine': {'type': str, 'choices': SUPPORTED_ENGINES},
+        'local_max_input_mb': CONFIG_NUMBER,
+    },
+    'streaming_config.yaml': {
+        'state_ttl': {'type': str, 'required': True},
+        'trigger_interval': {'type': str},
+        'available_now': {'type': bool},
+        'max_files_per_trigger': {'type': int},
+        'checkpoint_dir': {'type': str},
+    },
+    'spark_profiles_config.yaml': {
+        'default_profile': {'type': str},
+        'profiles': {'type': dict, 'required': True, 'values': {'type': dict, 'fields': {
+            'master': {'type': str},
+            'config': {'type': dict},
+        }}},
+    },
+}
+
+class DataProcessor:
+    """
+    DataProcessor class for processing client and financial data.
+
+    Class Attributes:
+        config_cache: Loaded configurations shared by all instances, keyed by file path.
+
+    Attributes:
+        logger: Logger instance for logging.
+        lazy: Whether row counts are collected during the final write instead of per stage.
+        incremental: Whether only new or changed ids are processed and merged into the output.
+        profile: Name of the Spark performance profile, or None for the default profile.
+        spark: The Spark session owned by the instance, created on first use.
+        stage_observations: Observations registered per stage in lazy mode.
+        stage_row_counts: Row counts of the stages counted eagerly.
+        stage_metrics: Metrics recorded per instrumented stage call.
+        rename_projection_cache: Compiled rename projections per config version and input columns.
+        source_timings: Wall time in seconds of the last read of each input source.
+        run_id: Identifier of the run, written with every stage metrics record.
+    """
+
+    config_cache = {}
+
+    def __init__(self, lazy=False, incremental=False, profile=None, engine=None):
+        """
+        Initialize DataProcessor instance.
+
+        Args:
+            lazy (bool): Collect row counts during the final write instead of per stage.
+            incremental (bool): Process only new or changed ids and merge them into the output.
+            profile (str): Name of the Spark performance profile, or None for the default profile.
+            engine (str): Execution engine ("auto", "spark" or "local"), or None for the configured engine.
+        """
+        self.logger = self.setup_logging()
+        self.load_all_configs()
+        self.lazy = lazy
+        self.incremental = incremental
+        self.profile = profile
+        self.engine = engine
+        self.spark = None
+        self.stage_metrics = []
+        self.rename_projection_cache = {}
+        self.source_timings = {}
+        self.input_bytes = {}
+        self.persisted_dataframes = []
+        self.session_conf_overrides = {}
+        self.session_conf_lock = threading.Lock()
+        self.output_locks = {}
+        self.output_locks_lock = threading.Lock()
+        self.run_id = uuid.uuid4().hex
+        self.stage_observations = {}
+        self.stage_row_counts = {}
+
+    def get_project_root(self):
+        """
+        Get the root directory of the project.
+
+        Returns:
+            str: The absolute path to the project root directory.
+        """
+        return os.path.dirname(os.path.abspath(__file__))
+
+    def get_config_path(self, config_file):
+        """
+        Get the absolute path to a configuration file.
+
+        Args:
+            config_file (str): The name of the configuration file.
+
+        Returns:
+            str: The absolute path to the configuration file.
+        """
+        return os.path.join(self.get_project_root(), 'config', config_file)
+
+    def get_logs_path(self, log_file):
+        """
+        Get the absolute path to a log file.
+
+        Args:
+            log_file (str): The name of the log file.
+
+        Returns:
+            str: The absolute path to the log file.
+        """
+        logs_folder_path = os.path.join(self.get_project_root(), 'logs')
+        if not os.path.exists(logs_folder_path):
+            os.makedirs(logs_folder_path)
+        return os.path.join(logs_folder_path, log_file)
+
+    def validate_config_value(self, value, schema, path):
+        """
+        Validate a configuration value against its schema.
+
+        A schema is a dict with the expected "type" and optionally "required", "choices",
+        "items" (schema of list items), "fields" (schemas of dict keys) and "values"
+        (schema of all dict values).
+
+        Args:
+            value: The configuration value.
+            schema (dict): The schema of the value.
+            path (str): The location of the value, used in error messages.
+
+        Raises:
+            ValueError: If the value does not match the schema.
+        """
+        if not isinstance(value, schema['type']):
+            expected_types = schema['type'] if isinstance(schema['type'], tuple) else (schema['type'],)
+            expected = ' or '.join(expected_type.__name__ for expected_type in expected_types)
+            raise ValueError(f"Invalid configuration {path}: expected {expected}, got {type(value).__name__}")
+        if 'choices' in schema and value not in schema['choices']:
+            raise ValueError(f"Invalid configuration {path}: {value} is not one of {list(schema['choices'])}")
+        if 'items' in schema:
+            for index, item in enumerate(value):
+                self.validate_config_value(item, schema['items'], f"{path}[{index}]")
+        if 'values' in schema:
+            for key, item in value.items():
+                self.validate_config_value(item, schema['values'], f"{path}.{key}")
+        for key, field_schema in schema.get('fields', {}).items():
+            if value.get(key) is not None:
+                self.validate_config_value(value[key], field_schema, f"{path}.{key}")
+            elif field_schema.get('required'):
+                raise ValueError(f"Invalid configuration {path}: missing {key}")
+
+    def load_config(self, config_file):
+        """
+        Load, validate and cache a configuration file.
+
+        The configuration is parsed once and served from the in-process cache until the
+        modification time of the file changes. The returned dict must not be modified.
+
+        Args:
+            config_file (str): The name of the configuration file.
+
+        Returns:
+            dict: The loaded configuration from the YAML file.
+
+        Raises:
+            ValueError: If the configuration does not match its schema.
+        """
+        config_path = self.get_config_path(config_file)
+        config_version = os.stat(config_path).st_mtime_ns
+        cached_config = DataProcessor.config_cache.get(config_path)
+        if cached_config and cached_config[0] == config_version:
+            return cached_config[1]
+
+        with open(config_path, 'r') as config_file_handle:
+            config = yaml.safe_load(config_file_handle) or {}
+        if config_file in CONFIG_SCHEMAS:
+            self.validate_config_value(config, {'type': dict, 'fields': CONFIG_SCHEMAS[config_file]}, config_file)
+
+        DataProcessor.config_cache[config_path] = (config_version, config)
+        return config
+
+    def load_all_configs(self):
+        """
+        Load and validate all pipeline configuration files.
+
+        Returns:
+            dict: The loaded configurations keyed by file name.
+        """
+        return {config_file: self.load_config(config_file) for config_file in CONFIG_SCHEMAS}
+
+    def load_column_selection_config(self):
+        """
+        Load column selection configuration from YAML file.
+
+        Returns:
+            dict: The loaded configuration from the YAML file.
+        """
+        return self.load_config('column_selection_config.yaml')
+
+    def load_schema_registry_config(self):
+        """
+        Load the dataset schema registry from YAML file.
+
+        Returns:
+            dict: The loaded configuration from the YAML file.
+        """
+        return self.load_config('schema_registry_config.yaml')
+
+    def build_schema(self, dataset):
+        """
+        Build a StructType for a dataset registered in the schema registry.
+
+        The schema lists every column of the file in file order, so that Spark can map
+        CSV fields by position and prune unselected columns while parsing.
+
+        Args:
+            dataset (str): The dataset key in the schema registry (e.g. "clients").
+
+        Returns:
+            StructType: The schema, or None if the dataset is not registered.
+
+        Raises:
+            ValueError: If a column uses an unsupported type.
+        """
+        registry = self.load_schema_registry_config().get('datasets', {})
+        columns = registry.get(dataset)
+        if not columns:
+            return None
+
+        fields = []
+        for column in columns:
+            type_name = column.get('type', 'string')
+            if type_name not in SCHEMA_TYPE_MAPPING:
+                raise ValueError(f"Unsupported type '{type_name}' for column '{column.get('name')}' in dataset '{dataset}'")
+            fields.append(StructField(column['name'], SCHEMA_TYPE_MAPPING[type_name](), column.get('nullable', True)))
+        return StructType(fields)
+
+    def get_schema_cache_path(self, file_path, dataset=None, input_paths=None):
+        """
+        Get the path of the cached inferred schema for a file.
+
+        The key covers the path and the size and modification time of each local input
+        file, so a rewritten file is inferred again instead of reusing a stale schema.
+
+        Args:
+            file_path (str): The path to the CSV file, or the input specification it was resolved from.
+            dataset (str): Optional dataset name used as a readable prefix.
+            input_paths (list): The resolved input files, or None for file_path.
+
+        Returns:
+            str: The absolute path to the cached schema JSON file.
+        """
+        inference_config = self.load_schema_registry_config().get('inference', {})
+        cache_folder_path = os.path.join(self.get_project_root(), inference_config.get('cache_dir', 'schema_cache'))
+        if not os.path.exists(cache_folder_path):
+            os.makedirs(cache_folder_path)
+        key_parts = [os.path.abspath(file_path)]
+        for input_path in sorted(input_paths or [file_path]):
+            if os.path.isfile(input_path):
+                file_stat = os.stat(input_path)
+                key_parts.append(f"{os.path.abspath(input_path)}:{file_stat.st_size}:{file_stat.st_mtime_ns}")
+        path_digest = hashlib.sha1("\n".join(key_parts).encode('utf-8')).hexdigest()[:16]
+        prefix = dataset or os.path.splitext(os.path.basename(file_path))[0]
+        return os.path.join(cache_folder_path, f"{prefix}_{path_digest}.json")
+
+    def infer_schema(self, spark, file_path, dataset=None, input_paths=None):
+        """
+        Infer a CSV schema by sampling and cache it on disk.
+
+        Used as a fallback for datasets missing from the schema registry. Subsequent runs
+        load the cached schema instead of scanning the file again.
+
+        Args:
+            spark (SparkSession): The Spark session.
+            file_path (str): The path to the CSV file, or the input specification it was resolved from.
+            dataset (str): Optional dataset name.
+            input_paths (list): The resolved input files, or None to read file_path.
+
+        Returns:
+            StructType: The inferred schema.
+        """
+        schema_cache_path = self.get_schema_cache_path(file_path, dataset, input_paths)
+        if os.path.exists(schema_cache_path):
+            with open(schema_cache_path, 'r') as schema_file:
+                self.logger.debug(f"Using cached schema {schema_cache_path}")
+                return StructType.fromJson(json.load(schema_file))
+
+        sampling_ratio = self.load_schema_registry_config().get('inference', {}).get('sampling_ratio', 1.0)
+        self.logger.info(f"Inferring schema of {file_path} (sampling ratio: {sampling_ratio})...")
+        schema = spark.read.csv(input_paths or file_path, header=True, inferSchema=True, samplingRatio=sampling_ratio).schema
+
+        with open(schema_cache_path, 'w') as schema_file:
+            json.dump(schema.jsonValue(), schema_file)
+        return schema
+
+    def track_row_count(self, data_df, stage, message):
+        """
+        Count the rows of a stage eagerly or register a lazy observation.
+
+        In lazy mode no Spark job is triggered; the row count is collected by an
+        Observation while the final write action runs and is reported afterwards
+        by log_stage_row_counts.
+
+        Args:
+            data_df (DataFrame): The DataFrame produced by the stage.
+            stage (str): The name of the stage.
+            message (str): The message logged with the row count.
+
+        Returns:
+            DataFrame: The DataFrame to continue the pipeline with.
+        """
+        if self.lazy:
+            observation = Observation(stage)
+            self.stage_observations[stage] = observation
+            self.logger.info(f"{message} Rows: deferred")
+            return data_df.observe(observation, count(lit(1)).alias("rows"))
+
+        row_count = data_df.count()
+        self.stage_row_counts[stage] = row_count
+        self.logger.info(f"{message} Rows: {row_count}")
+        return data_df
+
+    def log_stage_row_counts(self):
+        """
+        Log the row counts collected by observations.
+
+        When the runtime filter used the Bloom filter, its pruned rows are the financial
+        rows without a matching client, i.e. its input rows less the joined rows.
+
+        Must be called after the final action of the pipeline has completed.
+        """
+        stage_metrics = {stage: dict(observation.get) for stage, observation in self.stage_observations.items()}
+        runtime_filter_metrics = stage_metrics.get("Runtime filter")
+        joined_rows = stage_metrics.get("Joining datasets", {}).get("rows", self.stage_row_counts.get("Joining datasets"))
+        if runtime_filter_metrics is not None and 'pruned_rows' not in runtime_filter_metrics and joined_rows is not None:
+            runtime_filter_metrics['pruned_rows'] = runtime_filter_metrics['rows'] - joined_rows
+
+        for stage, metrics in stage_metrics.items():
+            metrics = ", ".join(f"{name.replace('_', ' ').capitalize()}: {value}" for name, value in metrics.items())
+            self.logger.info(f"{stage} - {metrics}")
+        self.stage_observations = {}
+        self.stage_row_counts = {}
+
+    def build_country_filter(self, countries):
+        """
+        Build the country filter condition.
+
+        Args:
+            countries (list): List of country names for filtering.
+
+        Returns:
+            Column: The filter condition on the country column.
+        """
+        return col("country").isin(countries)
+
+    @instrumented_stage("filter_data")
+    def filter_data(self, clients_df, countries):
+        """
+        Filter data based on specified conditions.
+
+        Args:
+            clients_df (DataFrame): The DataFrame to be filtered.
+            countries (list): List of country names for filtering.
+
+        Returns:
+            DataFrame: The filtered DataFrame.
+
+        Raises:
+            AnalysisException: If a Spark AnalysisException occurs during filtering.
+        """
+        try:
+            self.logger.info("Filtering data...")
+            result_data = clients_df.filter(self.build_country_filter(countries))
+            return self.track_row_count(result_data, "Filtering data", "Filtering data completed.")
+        except AnalysisException as ae:
+            self.logger.error(f"Spark AnalysisException in filter_data: {str(ae)}")
+            raise AnalysisException(f"Spark AnalysisException in filter_data: {str(ae)}")
+
+    def load_column_rename_config(self):
+        """
+        Load column renaming configuration from YAML file.
+
+        Returns:
+            dict: The loaded configuration from the YAML file.
+        """
+        return self.load_config('column_rename_config.yaml')
+
+    def get_config_version(self, config_file):
+        """
+        Get the version of a configuration file from its modification time.
+
+        Args:
+            config_file (str): The name of the configuration file.
+
+        Returns:
+            int: The modification time of the file in nanoseconds.
+        """
+        return os.stat(self.get_config_path(config_file)).st_mtime_ns
+
+    def get_renamed_columns(self, columns):
+        """
+        Map column names to their names after all configured renames.
+
+        Renames are applied in configuration order, so an entry can rename the result of
+        a previous one.
+
+        Args:
+            columns (list): The original column names.
+
+        Returns:
+            dict: The new name of every column, keyed by original name.
+        """
+        new_names = {column: column for column in columns}
+        for rename_entry in self.load_column_rename_config().get('renamed_columns', []):
+            original_name = rename_entry.get('original_name')
+            new_name = rename_entry.get('new_name')
+
+            if original_name and new_name:
+                for source, current_name in new_names.items():
+                    if current_name == original_name:
+                        new_names[source] = new_name
+        return new_names
+
+    def get_rename_plan(self, columns):
+        """
+        Compute the kept columns and their new names after renames, drops and ordering.
+
+        Dropped columns and the column order refer to the new names; columns missing
+        from column_order keep their position after the ordered ones.
+
+        Args:
+            columns (list): The column names of the input.
+
+        Returns:
+            list: The (original name, new name) of the output columns, in output order.
+        """
+        column_rename_config = self.load_column_rename_config()
+        new_names = self.get_renamed_columns(columns)
+        dropped_columns = set(column_rename_config.get('dropped_columns') or [])
+        kept_columns = [source for source in columns if new_names[source] not in dropped_columns]
+        column_order = column_rename_config.get('column_order') or []
+        order_positions = {name: position for position, name in enumerate(column_order)}
+        kept_columns.sort(key=lambda source: order_positions.get(new_names[source], len(column_order)))
+        return [(source, new_names[source]) for source in kept_columns]
+
+    def build_rename_projection(self, columns):
+        """
+        Compile the renames, dropped columns and column order into one projection.
+
+        Args:
+            columns (list): The column names of the input DataFrame.
+
+        Returns:
+            list: The Column expressions of the projection.
+        """
+        cache_key = (self.get_config_version('column_rename_config.yaml'), tuple(columns))
+        if cache_key in self.rename_projection_cache:
+            return self.rename_projection_cache[cache_key]
+
+        projection = [col(f"`{source}`").alias(new_name) for source, new_name in self.get_rename_plan(columns)]
+        self.rename_projection_cache[cache_key] = projection
+        return projection
+
+    @instrumented_stage("rename_columns")
+    def rename_columns(self, data_df):
+        """
+        Rename columns in the DataFrame based on the configuration file.
+
+        The renames, the dropped columns and the column order are applied as a single
+        projection compiled once per configuration version.
+
+        Args:
+            data_df (DataFrame): The DataFrame to be processed.
+
+        Returns:
+            DataFrame: The DataFrame with renamed columns.
+        """
+        self.logger.info("Renaming columns...")
+        data_df = data_df.select(self.build_rename_projection(data_df.columns))
+        self.logger.info("Column renaming completed.")
+        return data_df
+
+    def get_renamed_column(self, column_name):
+        """
+        Get the output name of a column after renaming.
+
+        Args:
+            column_name (str): The original column name.
+
+        Returns:
+            str: The new column name, or the original name if it is not renamed.
+        """
+        return self.get_renamed_columns([column_name])[column_name]
+
+    def compute_output_columns(self):
+        """
+        Compute the selected input columns that reach the output.
+
+        These are the columns of the selection configuration whose name after renaming
+        is not listed in dropped_columns.
+
+        Returns:
+            list: The original names of the output columns.
+        """
+        column_selection_config = self.load_column_selection_config()
+        selected_columns = list(dict.fromkeys(
+            column_selection_config.get('clients_columns', []) + column_selection_config.get('financials_columns', [])
+        ))
+        new_names = self.get_renamed_columns(selected_columns)
+        dropped_columns = set(self.load_column_rename_config().get('dropped_columns') or [])
+        return [column for column in selected_columns if new_names[column] not in dropped_columns]
+
+    def get_pruned_join_columns(self, clients_columns, financials_columns, join_key="id"):
+        """
+        Select the columns of the join inputs that are needed by the join or the output.
+
+        Args:
+            clients_columns (list): The column names of the client input.
+            financials_columns (list): The column names of the financial input.
+            join_key (str): The join key column, always kept on both sides.
+
+        Returns:
+            tuple: The kept client and financial column names.
+        """
+        output_columns = set(self.compute_output_columns())
+        kept_clients_columns = [column for column in clients_columns if column == join_key or column in output_columns]
+        kept_financials_columns = [
+            column for column in financials_columns
+            if column == join_key or (column in output_columns and column not in kept_clients_columns)
+        ]
+        return kept_clients_columns, kept_financials_columns
+
+    def prune_join_inputs(self, clients_df, financials_df, join_key="id"):
+        """
+        Prune the join inputs to the join key and the columns that reach the output.
+
+        Columns dropped after renaming never enter the shuffle, and financial columns that
+        duplicate a client column are removed before the join instead of after it. The
+        removed columns and estimated bytes saved are logged per input.
+
+        Args:
+            clients_df (DataFrame): The client DataFrame.
+            financials_df (DataFrame): The financial DataFrame.
+            join_key (str): The join key column, always kept on both sides.
+
+        Returns:
+            tuple: The pruned client and financial DataFrames.
+        """
+        clients_columns, financials_columns = self.get_pruned_join_columns(clients_df.columns, financials_df.columns, join_key)
+
+        pruned_inputs = []
+        for description, data_df, kept_columns in (("Clients", clients_df, clients_columns), ("Financials", financials_df, financials_columns)):
+            removed_columns = [column for column in data_df.columns if column not in kept_columns]
+            if not removed_columns:
+                pruned_inputs.append(data_df)
+                continue
+            pruned_df = data_df.select(kept_columns)
+            bytes_saved = self.estimate_size_in_bytes(data_df) - self.estimate_size_in_bytes(pruned_df)
+            self.logger.info(f"Pruned {description} columns before join: -{removed_columns}. Estimated bytes saved: {bytes_saved}")
+            pruned_inputs.append(pruned_df)
+        return tuple(pruned_inputs)
+
+    def load_join_config(self):
+        """
+        Load join strategy configuration from YAML file.
+
+        Returns:
+            dict: The loaded configuration from the YAML file.
+        """
+        return self.load_config('join_config.yaml')
+
+    def estimate_size_in_bytes(self, data_df):
+        """
+        Estimate the size of a DataFrame from its optimized plan.
+
+        The estimate comes from the Catalyst plan statistics and does not run a Spark job.
+
+        Args:
+            data_df (DataFrame): The DataFrame to be estimated.
+
+        Returns:
+            int: The estimated size in bytes.
+        """
+        return int(data_df._jdf.queryExecution().optimizedPlan().stats().sizeInBytes().toString())
+
+    def find_hot_keys(self, data_df, key, skew_config):
+        """
+        Find join keys that hold a large share of the rows.
+
+        The keys are counted and filtered by their share in Spark, so only the hot keys,
+        at most 1 / hot_key_min_share of them, are collected on the driver.
+
+        Args:
+            data_df (DataFrame): The DataFrame to be sampled.
+            key (str): The join key column.
+            skew_config (dict): The skew section of the join configuration.
+
+        Returns:
+            list: The hot key values.
+        """
+        sample_df = data_df.select(key).sample(fraction=skew_config.get('sample_fraction', 0.1), seed=42)
+        total_rows = sample_df.count()
+        if total_rows == 0:
+            return []
+        min_share = skew_config.get('hot_key_min_share', 0.05)
+        hot_key_counts = sample_df.groupBy(key).count().filter(col("count") >= min_share * total_rows)
+        return [row[key] for row in hot_key_counts.collect()]
+
+    def choose_join_strategy(self, clients_df, financials_df):
+        """
+        Choose the join strategy for the client and financial datasets.
+
+        A broadcast hash join is used when either side is estimated below the configured
+        threshold, otherwise a sort-merge join, salted when the financials hold hot ids.
+
+        Args:
+            clients_df (DataFrame): The client DataFrame.
+            financials_df (DataFrame): The financial DataFrame.
+
+        Returns:
+            tuple: The strategy ("broadcast", "sort_merge" or "skewed_sort_merge") and its detail:
+                the broadcast side, or the list of hot keys.
+        """
+        join_config = self.load_join_config()
+        threshold_bytes = join_config.get('broadcast_threshold_mb', 0) * 1024 * 1024
+        clients_size = self.estimate_size_in_bytes(clients_df)
+        financials_size = self.estimate_size_in_bytes(financials_df)
+        self.logger.debug(f"Estimated join input sizes - Clients: {clients_size} bytes, Financials: {financials_size} bytes")
+
+        if min(clients_size, financials_size) <= threshold_bytes:
+            if clients_size <= financials_size:
+                self.logger.info(f"Join strategy: broadcast hash join on clients. Shuffle saved: ~{financials_size} bytes")
+                return "broadcast", "clients"
+            self.logger.info(f"Join strategy: broadcast hash join on financials. Shuffle saved: ~{clients_size} bytes")
+            return "broadcast", "financials"
+
+        skew_config = join_config.get('skew', {})
+        if skew_config.get('enabled'):
+            hot_keys = self.find_hot_keys(financials_df, 'id', skew_config)
+            if hot_keys:
+                self.logger.info(f"Join strategy: salted sort-merge join for {len(hot_keys)} hot ids. Shuffle saved: 0 bytes")
+                return "skewed_sort_merge", hot_keys
+
+        self.logger.info("Join strategy: sort-merge join. Shuffle saved: 0 bytes")
+        return "sort_merge", None
+
+    def join_with_salted_keys(self, clients_df, financials_df, hot_keys, salt_buckets):
+        """
+        Sort-merge join that spreads hot keys over salted partitions.
+
+        Financial rows of hot ids get a random salt, and the matching client rows are
+        replicated once per salt value, so each hot id is joined by several tasks.
+
+        Args:
+            clients_df (DataFrame): The client DataFrame.
+            financials_df (DataFrame): The financial DataFrame.
+            hot_keys (list): The hot id values.
+            salt_buckets (int): The number of salt values per hot id.
+
+        Returns:
+            DataFrame: The joined DataFrame.
+        """
+        salted_financials = financials_df.withColumn(
+            "join_salt",
+            when(financials_df.id.isin(hot_keys), floor(rand(seed=42) * salt_buckets).cast("int")).otherwise(lit(0))
+        )
+        salted_clients = clients_df.withColumn(
+            "join_salt",
+            explode(when(clients_df.id.isin(hot_keys), array(*[lit(i) for i in range(salt_buckets)])).otherwise(array(lit(0))))
+        )
+        join_condition = (salted_clients.id == salted_financials.id) & (salted_clients.join_salt == salted_financials.join_salt)
+        return (
+            salted_clients.join(salted_financials, join_condition)
+            .drop(salted_financials.id)
+            .drop(salted_financials.join_salt)
+            .drop(salted_clients.join_salt)
+        )
+
+    def set_session_conf(self, key, value):
+        """
+        Set a Spark SQL setting for the current run.
+
+        The value before the first change is kept, so that restore_session_conf can undo
+        the change once the run is over. Safe to call from the threads reading the sources.
+
+        Args:
+            key (str): The setting key.
+            value (str): The setting value.
+        """
+        spark_conf = self.create_spark_session().conf
+        with self.session_conf_lock:
+            if key not in self.session_conf_overrides:
+                self.session_conf_overrides[key] = spark_conf.get(key, None)
+            spark_conf.set(key, value)
+
+    def restore_session_conf(self):
+        """
+        Restore the Spark SQL settings changed by set_session_conf.
+        """
+        if self.spark is None:
+            return
+        for key, original_value in self.session_conf_overrides.items():
+            if original_value is None:
+                self.spark.conf.unset(key)
+            else:
+                self.spark.conf.set(key, original_value)
+        self.session_conf_overrides = {}
+
+    @instrumented_stage("runtime_filter")
+    def apply_runtime_filter(self, clients_df, financials_df, join_key="id"):
+        """
+        Prune the financials to the ids of the filtered clients before the join.
+
+        When the filtered clients hold at most max_id_set_size distinct ids, the sorted
+        ids are collected and the financials are filtered with them; the input and pruned
+        row counts are collected by an Observation during the write. Larger id sets
+        enable Spark's runtime Bloom filter instead, sized from the estimated number of
+        ids and the configured false positive rate, which Spark builds from the client
+        side of the sort-merge join and applies to the financials scan; its input rows are
+        observed and its pruned rows derived from the joined rows by log_stage_row_counts.
+        In lazy mode the ids are not counted nor collected, so the Bloom filter is sized
+        for expected_ids. The Bloom filter settings are restored by restore_session_conf
+        after the run.
+
+        Without any client id all financial rows are pruned, and no Observation is
+        registered, as Spark replaces the pruned subtree, observation included, with an
+        empty relation and the Observation would never complete.
+
+        Args:
+            clients_df (DataFrame): The filtered client DataFrame.
+            financials_df (DataFrame): The financial DataFrame.
+            join_key (str): The join key column.
+
+        Returns:
+            DataFrame: The financial DataFrame to join with.
+        """
+        filter_config = self.load_join_config().get('runtime_filter', {})
+        if not filter_config.get('enabled'):
+            return financials_df
+
+        max_id_set_size = filter_config.get('max_id_set_size', 10000)
+        estimated_ids = None
+        if not self.lazy:
+            estimated_ids = clients_df.agg(approx_count_distinct(join_key).alias("ids")).first()["ids"]
+
+        if estimated_ids is not None and estimated_ids <= max_id_set_size:
+            client_ids = sorted(row[join_key] for row in clients_df.select(join_key).distinct().collect())
+            if not client_ids:
+                self.logger.info("Runtime filter: no client ids, all financial rows are pruned.")
+                return financials_df.filter(lit(False))
+            if len(client_ids) <= max_id_set_size:
+                self.logger.info(f"Runtime filter: sorted set of {len(client_ids)} client ids.")
+                kept_rows = col(join_key).isin(client_ids)
+                observation = Observation("Runtime filter")
+                self.stage_observations["Runtime filter"] = observation
+                financials_df = financials_df.observe(
+                    observation, count(lit(1)).alias("rows"), (count(lit(1)) - count(when(kept_rows, True))).alias("pruned_rows")
+                )
+                return financials_df.filter(kept_rows)
+
+        false_positive_rate = filter_config.get('false_positive_rate', 0.03)
+        expected_items = max(estimated_ids if estimated_ids is not None else filter_config.get('expected_ids', 1000000), 1)
+        num_bits = math.ceil(-expected_items * math.log(false_positive_rate) / math.log(2) ** 2)
+        self.set_session_conf("spark.sql.optimizer.runtime.bloomFilter.enabled", "true")
+        self.set_session_conf("spark.sql.optimizer.runtime.bloomFilter.expectedNumItems", str(expected_items))
+        self.set_session_conf("spark.sql.optimizer.runtime.bloomFilter.maxNumItems", str(expected_items))
+        self.set_session_conf("spark.sql.optimizer.runtime.bloomFilter.numBits", str(num_bits))
+        self.set_session_conf("spark.sql.optimizer.runtime.bloomFilter.maxNumBits", str(num_bits))
+        self.set_session_conf(
+            "spark.sql.optimizer.runtime.bloomFilter.creationSideThreshold",
+            f"{max(self.estimate_size_in_bytes(clients_df), 10 * 1024 * 1024)}b"
+        )
+        self.set_session_conf(
+            "spark.sql.optimizer.runtime.bloomFilter.applicationSideScanSizeThreshold",
+            f"{int(filter_config.get('min_application_side_mb', 64))}MB"
+        )
+        self.logger.info(
+            f"Runtime filter: Bloom filter for ~{expected_items} client ids, "
+            f"{num_bits} bits, false positive rate {false_positive_rate}."
+        )
+        observation = Observation("Runtime filter")
+        self.stage_observations["Runtime filter"] = observation
+        return financials_df.observe(observation, count(lit(1)).alias("rows"))
+
+    def load_persistence_config(self):
+        """
+        Load intermediate persistence configuration from YAML file.
+
+        Returns:
+            dict: The loaded configuration from the YAML file.
+        """
+        return self.load_config('persistence_config.yaml')
+
+    def persist_stage(self, data_df, stage):
+        """
+        Persist or checkpoint the DataFrame of a stage according to the persistence policy.
+
+        Persisted DataFrames are computed once by their first action and reused by the
+        following ones, instead of being recomputed from the inputs. A checkpoint is
+        written eagerly and also truncates the lineage. The checkpoint directory belongs to
+        the SparkContext and is shared by all runs on it, so it is set only once and its
+        files are removed by the context cleaner (spark.cleaner.referenceTracking.cleanCheckpoints)
+        when the checkpointed data is no longer referenced. In lazy mode nothing is persisted,
+        since the final write is the only action.
+
+        Args:
+            data_df (DataFrame): The DataFrame produced by the stage.
+            stage (str): The stage key in the persistence configuration (e.g. "joined_data").
+
+        Returns:
+            DataFrame: The DataFrame to continue the pipeline with.
+        """
+        persistence_config = self.load_persistence_config()
+        policy = persistence_config.get(stage, 'none')
+        if policy == 'none' or self.lazy:
+            return data_df
+
+        if policy == 'checkpoint':
+            spark = self.create_spark_session()
+            with CHECKPOINT_DIR_LOCK:
+                if not spark.sparkContext.getCheckpointDir():
+                    checkpoint_dir = persistence_config.get('checkpoint_dir', 'spark_checkpoints')
+                    if self.is_local_path(checkpoint_dir) and not os.path.isabs(checkpoint_dir):
+                        checkpoint_dir = os.path.join(self.get_project_root(), checkpoint_dir)
+                    spark.sparkContext.setCheckpointDir(checkpoint_dir)
+            self.logger.info(f"Checkpointing {stage} to {spark.sparkContext.getCheckpointDir()}...")
+            return data_df.checkpoint(eager=True)
+
+        self.logger.info(f"Persisting {stage} with storage level {policy}.")
+        data_df = data_df.persist(getattr(StorageLevel, policy))
+        self.persisted_dataframes.append((stage, data_df))
+        return data_df
+
+    def get_cached_rdd_id(self, data_df):
+        """
+        Get the id of the RDD holding the cached data of a persisted DataFrame.
+
+        Args:
+            data_df (DataFrame): The persisted DataFrame.
+
+        Returns:
+            int: The RDD id, or None if the DataFrame is not cached.
+        """
+        cache_manager = data_df.sparkSession._jsparkSession.sharedState().cacheManager()
+        cached_data = cache_manager.lookupCachedData(data_df._jdf)
+        if cached_data.isEmpty():
+            return None
+        return cached_data.get().cachedRepresentation().cacheBuilder().cachedColumnBuffers().id()
+
+    def log_cached_sizes(self):
+        """
+        Log the memory and disk size of the DataFrames persisted by this run.
+
+        The SparkContext is shared with the other jobs of the job server, so its cached RDDs
+        are matched to the persisted DataFrames of the run by their RDD id.
+        """
+        if self.spark is None or not self.persisted_dataframes:
+            return
+        stages_by_rdd_id = {self.get_cached_rdd_id(data_df): stage for stage, data_df in self.persisted_dataframes}
+        for rdd_info in self.spark.sparkContext._jsc.sc().getRDDStorageInfo():
+            stage = stages_by_rdd_id.get(rdd_info.id())
+            if stage is None:
+                continue
+            self.logger.info(
+                f"Cached {stage} (RDD {rdd_info.id()}): {rdd_info.numCachedPartitions()} partitions, "
+                f"memory {rdd_info.memSize()} bytes, disk {rdd_info.diskSize()} bytes"
+            )
+
+    def release_persisted_data(self):
+        """
+        Unpersist the persisted DataFrames of the run.
+        """
+        self.log_cached_sizes()
+        for stage, data_df in self.persisted_dataframes:
+            data_df.unpersist()
+            self.logger.info(f"Unpersisted {stage}.")
+        self.persisted_dataframes = []
+
+    @instrumented_stage("join_datasets")
+    def join_datasets(self, clients_df, financials_df):
+        """
+        Join client and financial datasets without explicit column renaming.
+
+        Args:
+            clients_df (DataFrame): The client DataFrame.
+            financials_df (DataFrame): The financial DataFrame.
+
+        Returns:
+            DataFrame: The joined DataFrame.
+
+        Raises:
+            AnalysisException: If a Spark AnalysisException occurs during joining.
+        """
+        try:
+            self.logger.info("Joining datasets...")
+            strategy, strategy_detail = self.choose_join_strategy(clients_df, financials_df)
+
+            if strategy == "skewed_sort_merge":
+                salt_buckets = self.load_join_config().get('skew', {}).get('salt_buckets', 16)
+                result_data = self.join_with_salted_keys(clients_df, financials_df, strategy_detail, salt_buckets)
+            else:
+                if strategy == "broadcast" and strategy_detail == "clients":
+                    clients_df = broadcast(clients_df)
+                elif strategy == "broadcast":
+                    financials_df = broadcast(financials_df)
+                else:
+                    clients_df = clients_df.hint("merge")
+                result_data = clients_df.join(financials_df, clients_df.id == financials_df.id).drop(financials_df.id)
+
+            result_data = self.persist_stage(result_data, "joined_data")
+            return self.track_row_count(result_data, "Joining datasets", "Joining datasets completed.")
+        except AnalysisException as ae:
+            self.logger.error(f"Spark AnalysisException in join_datasets: {str(ae)}")
+            raise AnalysisException(f"Spark AnalysisException in join_datasets: {str(ae)}")
+
+    def load_partitioning_config(self):
+        """
+        Load skew-aware partitioning configuration from YAML file.
+
+        Returns:
+            dict: The loaded configuration from the YAML file.
+        """
+        return self.load_config('partitioning_config.yaml')
+
+    def repartition_skew_aware(self, data_df):
+        """
+        Repartition a DataFrame by country, salting hot countries.
+
+        Applied to the joined data right before the write, when the output is partitioned
+        by the partition column: each write task then receives rows of a single country,
+        and no task receives a whole hot country. A sample gives the share of rows and
+        distinct ids per country. The number of partitions is sized to the target
+        partition size, and every country holding at least hot_key_min_share of the rows
+        is spread over salt buckets by id in proportion to its share.
+
+        Args:
+            data_df (DataFrame): The DataFrame to be repartitioned.
+
+        Returns:
+            DataFrame: The repartitioned DataFrame, or data_df if partitioning is disabled,
+                the output is not partitioned by the partition column or the sample is empty.
+        """
+        partitioning_config = self.load_partitioning_config()
+        if not partitioning_config.get('enabled'):
+            return data_df
+
+        partition_column = partitioning_config.get('partition_column', 'country')
+        if self.get_renamed_column(partition_column) not in (self.load_writer_config().get('partition_by') or []):
+            self.logger.debug(f"Skew-aware partitioning skipped: the output is not partitioned by {partition_column}.")
+            return data_df
+
+        key_column = partitioning_config.get('key_column', 'id')
+        sample_fraction = partitioning_config.get('sample_fraction', 0.05)
+        country_statistics = (
+            data_df.sample(fraction=sample_fraction, seed=42)
+            .groupBy(partition_column)
+            .agg(count(lit(1)).alias("rows"), countDistinct(key_column).alias("distinct_ids"))
+            .collect()
+        )
+        sampled_rows = sum(row["rows"] for row in country_statistics)
+        if sampled_rows == 0:
+            self.logger.info("Skew-aware partitioning skipped: empty sample.")
+            return data_df
+
+        estimated_bytes = int(sampled_rows / sample_fraction) * max(1, data_df._jdf.schema().defaultSize())
+        target_partition_bytes = partitioning_config.get('target_partition_mb', 128) * 1024 * 1024
+        num_partitions = max(1, math.ceil(estimated_bytes / target_partition_bytes))
+
+        salt = lit(0)
+        hot_key_min_share = partitioning_config.get('hot_key_min_share', 0.2)
+        max_salt_buckets = partitioning_config.get('max_salt_buckets', 64)
+        for row in sorted(country_statistics, key=lambda row: -row["rows"]):
+            share = row["rows"] / sampled_rows
+            salt_buckets = 1
+            if share >= hot_key_min_share:
+                salt_buckets = max(1, min(max_salt_buckets, math.ceil(share * num_partitions)))
+                salt = when(col(partition_column) == row[partition_column], pmod(xxhash64(col(key_column)), lit(salt_buckets))).otherwise(salt)
+            self.logger.info(
+                f"Skew statistics - {partition_column}: {row[partition_column]}, share: {share:.2%}, "
+                f"sampled distinct ids: {row['distinct_ids']}, salt buckets: {salt_buckets}"
+            )
+
+        self.logger.info(f"Repartitioning into {num_partitions} partitions (estimated {estimated_bytes} bytes).")
+        return (
+            data_df.withColumn("partition_salt", salt)
+            .repartition(num_partitions, partition_column, "partition_salt")
+            .drop("partition_salt")
+        )
+
+    def load_spark_profiles_config(self):
+        """
+        Load Spark performance profiles from YAML file.
+
+        Returns:
+            dict: The loaded configuration from the YAML file.
+        """
+        return self.load_config('spark_profiles_config.yaml')
+
+    def create_spark_session(self, app_name="DataProcessor"):
+        """
+        Create the Spark session of the DataProcessor from a performance profile.
+
+        The session is created once and reused by every stage of the instance.
+
+        Args:
+            app_name (str): The name of the Spark application.
+
+        Returns:
+            SparkSession: The Spark session instance.
+
+        Raises:
+            ValueError: If the profile is not defined.
+        """
+        if self.spark is not None:
+            return self.spark
+
+        profiles_config = self.load_spark_profiles_config()
+        profile_name = self.profile or profiles_config.get('default_profile', 'local')
+        profile = profiles_config.get('profiles', {}).get(profile_name)
+        if profile is None:
+            raise ValueError(f"Unknown Spark profile: {profile_name}")
+
+        self.logger.info(f"Creating Spark session with profile {profile_name}...")
+        builder = SparkSession.builder.appName(app_name)
+        if profile.get('master'):
+            builder = builder.master(profile['master'])
+        for key, value in profile.get('config', {}).items():
+            builder = builder.config(key, str(value).lower() if isinstance(value, bool) else str(value))
+        self.spark = builder.getOrCreate()
+        return self.spark
+
+    def setup_logging(self):
+        """
+        Set up logging configuration based on a YAML file.
+
+        The handlers are added once per process, so DataProcessor instances created
+        later (e.g. one per job of the job server) reuse the configured logger.
+
+        Returns:
+            Logger: The configured Logger instance.
+        """
+        logger = logging.getLogger("BitcoinTrading rotating Log")
+        if logger.handlers:
+            return logger
+
+        config = self.load_config('logging_config.yaml')
+
+        logs_path = self.get_logs_path('BitcoinTrading.log')
+        logs_formatter = config['logs_formatter']
+        time_formatter = config['time_formatter']
+
+        file_handler_config = config.get('file_handler', {})
+        file_handler_mode = file_handler_config.get('mode',)
+        file_handler_max_bytes = file_handler_config.get('max_bytes')
+        file_handler_backup_count = file_handler_config.get('backup_count')
+
+        log_handler = logging.handlers.RotatingFileHandler(
+            filename=logs_path,
+            mode=file_handler_mode,
+            maxBytes=file_handler_max_bytes,
+            backupCount=file_handler_backup_count
+        )
+
+        formatter = logging.Formatter(logs_formatter, time_formatter)
+        formatter.converter = time.gmtime
+        log_handler.setFormatter(formatter)
+
+        logger.setLevel(logging.DEBUG)
+        logger.addHandler(log_handler)
+
+        streamHandler = logging.StreamHandler()
+        streamHandler.setFormatter(formatter)
+        logger.addHandler(streamHandler)
+
+        logger.info("Logging initialized.")
+        return logger
+
+    def get_input_format(self, file_path):
+        """
+        Get the input format of a file from its extension.
+
+        Args:
+            file_path (str): The path to the input file or directory.
+
+        Returns:
+            str: "parquet", "orc" or "csv".
+        """
+        extension = os.path.splitext(file_path.rstrip('/'))[1].lower()
+        return COLUMNAR_INPUT_EXTENSIONS.get(extension, 'csv')
+
+    def load_staging_config(self):
+        """
+        Load columnar staging configuration from YAML file.
+
+        Returns:
+            dict: The loaded configuration from the YAML file.
+        """
+        return self.load_config('staging_config.yaml')
+
+    def get_staging_key(self, file_path, schema, chunk_bytes):
+        """
+        Compute the staging key of a raw input file.
+
+        The key covers the file path, size, modification time, content hash and the
+        schema used for parsing, so any change to the file or its schema invalidates
+        the staged copy.
+
+        Args:
+            file_path (str): The path to the CSV file.
+            schema (StructType): The schema used to parse the file.
+            chunk_bytes (int): The size of the chunks read while hashing the content.
+
+        Returns:
+            str: The staging key.
+        """
+        file_stat = os.stat(file_path)
+        content_hash = hashlib.sha256()
+        with open(file_path, 'rb') as raw_file:
+            for chunk in iter(lambda: raw_file.read(chunk_bytes), b''):
+                content_hash.update(chunk)
+
+        key_hash = hashlib.sha256()
+        for key_part in (os.path.abspath(file_path), file_stat.st_size, file_stat.st_mtime_ns, content_hash.hexdigest(), schema.json()):
+            key_hash.update(str(key_part).encode('utf-8'))
+        return key_hash.hexdigest()
+
+    def stage_csv_file(self, spark, file_path, schema):
+        """
+        Convert a raw CSV file to a staged Parquet copy, reusing an existing one.
+
+        The copy is written to a temporary directory and renamed into place, so a staged
+        copy exists only once complete. If a concurrent run published the same copy in
+        the meantime, the temporary directory is discarded and the published copy is
+        used, so a copy another run is reading is never replaced.
+
+        Args:
+            spark (SparkSession): The Spark session.
+            file_path (str): The path to the CSV file.
+            schema (StructType): The schema used to parse the file.
+
+        Returns:
+            str: The path to the staged Parquet copy, or None if staging is disabled
+                or the input is not a local file.
+        """
+        staging_config = self.load_staging_config()
+        if not staging_config.get('enabled') or not os.path.isfile(file_path):
+            return None
+
+        staging_folder_path = os.path.join(self.get_project_root(), staging_config.get('staging_dir', 'staging'))
+        if not os.path.exists(staging_folder_path):
+            os.makedirs(staging_folder_path)
+        staging_key = self.get_staging_key(file_path, schema, staging_config.get('hash_chunk_bytes', 8 * 1024 * 1024))
+        staged_path = os.path.join(staging_folder_path, f"{staging_key}.parquet")
+
+        if os.path.exists(os.path.join(staged_path, '_SUCCESS')):
+            self.logger.info(f"Using staged copy of {file_path}")
+            os.utime(staged_path)
+            return staged_path
+
+        self.logger.info(f"Staging {file_path} as Parquet...")
+        temporary_path = os.path.join(staging_folder_path, f".{staging_key}.{uuid.uuid4().hex}.tmp")
+        spark.read.csv(file_path, header=True, schema=schema).write.parquet(temporary_path)
+        try:
+            os.rename(temporary_path, staged_path)
+        except OSError:
+            shutil.rmtree(temporary_path, ignore_errors=True)
+            if not os.path.exists(os.path.join(staged_path, '_SUCCESS')):
+                raise
+            self.logger.info(f"Using staged copy of {file_path} published by a concurrent run")
+            os.utime(staged_path)
+
+        self.evict_staged_files(
+            staging_folder_path, staging_config.get('max_staged_bytes'), staged_path,
+            staging_config.get('min_idle_seconds', 0)
+        )
+        return staged_path
+
+    def evict_staged_files(self, staging_folder_path, max_staged_bytes, keep_path=None, min_idle_seconds=0):
+        """
+        Evict least recently used staged copies above the size limit.
+
+        Every run touches the staged copies it uses, so copies used within the last
+        min_idle_seconds are kept, as a concurrent run may still be reading them. An
+        evicted copy is first renamed away, so no run ever sees a partially deleted copy.
+
+        Args:
+            staging_folder_path (str): The staging directory.
+            max_staged_bytes (int): The maximum total size of the staged copies.
+            keep_path (str): A staged copy that must not be evicted.
+            min_idle_seconds (float): The time since its last use before a copy may be evicted.
+        """
+        if not max_staged_bytes:
+            return
+
+        staged_copies = []
+        for entry in os.scandir(staging_folder_path):
+            if entry.is_dir() and entry.name.endswith('.parquet'):
+                size = sum(
+                    os.path.getsize(os.path.join(root, name))
+                    for root, _, names in os.walk(entry.path) for name in names
+                )
+                staged_copies.append((entry.stat().st_mtime, size, entry.path))
+
+        total_bytes = sum(size for _, size, _ in staged_copies)
+        for _, size, path in sorted(staged_copies):
+            if total_bytes <= max_staged_bytes:
+                break
+            if path == keep_path:
+                continue
+            evicted_path = os.path.join(staging_folder_path, f".{uuid.uuid4().hex}.evicted")
+            try:
+                if os.path.getmtime(path) > time.time() - min_idle_seconds:
+                    continue
+                os.rename(path, evicted_path)
+            except FileNotFoundError:
+                continue
+            self.logger.info(f"Evicting staged copy {path} ({size} bytes)")
+            shutil.rmtree(evicted_path, ignore_errors=True)
+            total_bytes -= size
+
+    def scan_directory(self, directory):
+        """
+        List the data files and subdirectories of a single directory.
+
+        Hidden entries and entries starting with an underscore (e.g. _SUCCESS) are skipped.
+
+        Args:
+            directory (str): The directory to scan.
+
+        Returns:
+            tuple: The directory, its modification time, a list of (path, size) of its files,
+                and a list of its subdirectories.
+        """
+        files = []
+        subdirectories = []
+        for entry in os.scandir(directory):
+            if entry.name.startswith(('.', '_')):
+                continue
+            if entry.is_dir():
+                subdirectories.append(entry.path)
+            elif entry.is_file():
+                files.append((entry.path, entry.stat().st_size))
+        return directory, os.stat(directory).st_mtime_ns, files, subdirectories
+
+    def list_directory_files(self, directory, listing_threads):
+        """
+        Recursively list the data files of a directory with parallel scans.
+
+        Each level of the directory tree is scanned concurrently.
+
+        Args:
+            directory (str): The root directory.
+            listing_threads (int): The number of scanning threads.
+
+        Returns:
+            tuple: A list of (path, size) of the files and the modification time of every
+                scanned directory.
+        """
+        files = []
+        directory_versions = {}
+        pending_directories = [directory]
+        with ThreadPoolExecutor(max_workers=max(1, listing_threads)) as executor:
+            while pending_directories:
+                scanned_directories = list(executor.map(self.scan_directory, pending_directories))
+                pending_directories = []
+                for scanned_directory, directory_version, directory_files, subdirectories in scanned_directories:
+                    directory_versions[scanned_directory] = directory_version
+                    files.extend(directory_files)
+                    pending_directories.extend(subdirectories)
+        return files, directory_versions
+
+    def match_glob(self, path, pattern):
+        """
+        Match a path against a glob pattern one path component at a time.
+
+        Unlike fnmatch on the full path, * and ? never match a path separator, so
+        "clients/*/*.csv" only matches files exactly two levels below clients, as in
+        Spark and Hadoop globs.
+
+        Args:
+            path (str): The path to match.
+            pattern (str): The glob pattern.
+
+        Returns:
+            bool: True if the path matches the pattern.
+        """
+        path_components = os.path.normpath(path).split(os.sep)
+        pattern_components = os.path.normpath(pattern).split(os.sep)
+        return len(path_components) == len(pattern_components) and all(
+            fnmatch.fnmatch(path_component, pattern_component)
+            for path_component, pattern_component in zip(path_components, pattern_components)
+        )
+
+    def list_input_files(self, path_spec):
+        """
+        List the files of a directory or glob through the cached file index.
+
+        The index of a listing is reused as long as none of the scanned directories changed,
+        so repeated runs over the same shard set skip the listing. A glob pattern matches a
+        file, or the directory of a file, path component by path component (see match_glob).
+
+        Args:
+            path_spec (str): A local directory or glob pattern.
+
+        Returns:
+            list: The (path, size) of the matching files, sorted by path.
+        """
+        ingestion_config = self.load_ingestion_config()
+        index_folder_path = os.path.join(self.get_project_root(), ingestion_config.get('file_index_dir', 'file_index'))
+        if not os.path.exists(index_folder_path):
+            os.makedirs(index_folder_path)
+        index_path = os.path.join(index_folder_path, f"{hashlib.sha1(os.path.abspath(path_spec).encode('utf-8')).hexdigest()}.json")
+
+        if os.path.exists(index_path):
+            with open(index_path, 'r') as index_file:
+                file_index = json.load(index_file)
+            if all(os.path.isdir(directory) and os.stat(directory).st_mtime_ns == version
+                   for directory, version in file_index['directories'].items()):
+                self.logger.debug(f"Using cached file index for {path_spec}")
+                return [tuple(file_entry) for file_entry in file_index['files']]
+
+        is_glob = any(character in path_spec for character in GLOB_CHARACTERS)
+        base_directory = path_spec
+        if is_glob:
+            base_directory = os.path.dirname(path_spec[:min(path_spec.index(c) for c in GLOB_CHARACTERS if c in path_spec)]) or '.'
+
+        self.logger.info(f"Listing input files of {path_spec}...")
+        files, directory_versions = self.list_directory_files(base_directory, ingestion_config.get('listing_threads', 8))
+        if is_glob:
+            files = [
+                (path, size) for path, size in files
+                if self.match_glob(path, path_spec) or self.match_glob(os.path.dirname(path), path_spec)
+            ]
+        files.sort()
+
+        with open(index_path, 'w') as index_file:
+            json.dump({'path_spec': path_spec, 'directories': directory_versions, 'files': files}, index_file)
+        return files
+
+    def resolve_input_paths(self, path_spec):
+        """
+        Resolve a file, glob, directory or manifest to the input files.
+
+        A manifest is a file with the .manifest extension listing one file, glob or directory
+        per line; relative entries are resolved against the manifest directory and lines
+        starting with # are ignored. Remote URIs are passed to Spark unchanged.
+
+        Args:
+            path_spec (str): The input specification.
+
+        Returns:
+            list: The (path, size) of the input files; the size is None for remote URIs.
+
+        Raises:
+            FileNotFoundError: If the specification matches no files.
+        """
+        if not self.is_local_path(path_spec):
+            return [(path_spec, None)]
+
+        if path_spec.endswith(MANIFEST_EXTENSION) and os.path.isfile(path_spec):
+            manifest_directory = os.path.dirname(os.path.abspath(path_spec))
+            input_files = []
+            with open(path_spec, 'r') as manifest_file:
+                for line in manifest_file:
+                    entry = line.strip()
+                    if not entry or entry.startswith('#'):
+                        continue
+                    if self.is_local_path(entry) and not os.path.isabs(entry):
+                        entry = os.path.join(manifest_directory, entry)
+                    input_files.extend(self.resolve_input_paths(entry))
+        elif os.path.isfile(path_spec):
+            input_files = [(path_spec, os.path.getsize(path_spec))]
+        else:
+            input_files = self.list_input_files(path_spec)
+
+        if not input_files:
+            raise FileNotFoundError(f"No input files found for {path_spec}")
+        return input_files
+
+    def plan_input_splits(self, spark, input_files):
+        """
+        Size the Spark input splits from the total input size.
+
+        The split size spreads the input over the default parallelism, bounded by the
+        configured minimum and maximum. The setting applies to the current run.
+
+        Args:
+            spark (SparkSession): The Spark session.
+            input_files (list): The (path, size) of the input files.
+        """
+        total_bytes = sum(size for _, size in input_files if size)
+        if not total_bytes:
+            return
+
+        ingestion_config = self.load_ingestion_config()
+        min_split_bytes = int(ingestion_config.get('min_split_mb', 16) * 1024 * 1024)
+        max_split_bytes = int(ingestion_config.get('max_split_mb', 256) * 1024 * 1024)
+        split_bytes = math.ceil(total_bytes / max(1, spark.sparkContext.defaultParallelism))
+        split_bytes = min(max(split_bytes, min_split_bytes), max_split_bytes)
+
+        self.set_session_conf("spark.sql.files.maxPartitionBytes", str(split_bytes))
+        self.logger.info(f"Planned input splits: {len(input_files)} files, {total_bytes} bytes, split size {split_bytes} bytes")
+
+    @instrumented_stage("read_csv_file", label_argument="description")
+    def read_csv_file(self, file_path, description, selected_columns=None, dataset=None, countries=None, plan_splits=True):
+        """
+        Read a CSV file into a Spark DataFrame and select specific columns.
+
+        file_path may also be a glob, a directory or a manifest of shards, which are listed
+        in parallel and through a cached file index; unless plan_splits is False, the input
+        splits are then sized from the total input size. Paths with a .parquet or .orc extension are listed by Spark
+        itself to keep partition discovery.
+
+        The schema is taken from the schema registry when the dataset is registered,
+        otherwise it is inferred once by sampling and cached for subsequent runs.
+        Parquet and ORC inputs are read with their own schema. Local CSV files are converted
+        to a staged Parquet copy once and served from it on subsequent runs.
+
+        When countries are given, the country filter is applied directly on the scan: Parquet
+        and ORC push it down to row groups and prune country partitions, and the CSV parser
+        drops non-matching rows before converting the remaining columns.
+
+        Args:
+            file_path (str): The path to the CSV file, or a glob, directory or manifest.
+            description (str): A description of the data being read.
+            selected_columns (list): List of column names to select.
+            dataset (str): The dataset key in the schema registry (e.g. "clients").
+            countries (list): List of countries to keep, or None to read all rows.
+            plan_splits (bool): Whether to size the input splits from this input alone; False
+                when the caller planned them for all inputs of the run.
+
+        Returns:
+            DataFrame: The Spark DataFrame.
+
+        Raises:
+            Exception: If an error occurs during file reading.
+        """
+        try:
+            self.logger.info(f"Reading {description} file...")
+            spark = self.create_spark_session()
+
+            input_format = self.get_input_format(file_path)
+            self.input_bytes[file_path] = None
+            if input_format == 'csv':
+                input_files = self.resolve_input_paths(file_path)
+                input_paths = [path for path, _ in input_files]
+                if all(size is not None for _, size in input_files):
+                    self.input_bytes[file_path] = sum(size for _, size in input_files)
+                if plan_splits:
+                    self.plan_input_splits(spark, input_files)
+                input_format = self.get_input_format(input_paths[0])
+
+            if input_format == 'csv':
+                schema = self.build_schema(dataset) if dataset else None
+                if schema is None:
+                    schema = self.infer_schema(spark, file_path, dataset, input_paths)
+                staged_path = self.stage_csv_file(spark, input_paths[0], schema) if len(input_paths) == 1 else None
+                if staged_path:
+                    data = spark.read.parquet(staged_path)
+                else:
+                    self.set_session_conf("spark.sql.csv.filterPushdown.enabled", "true")
+                    data = spark.read.csv(input_paths, header=True, schema=schema)
+            elif input_format == self.get_input_format(file_path):
+                data = spark.read.format(input_format).load(file_path)
+            else:
+                reader = spark.read.format(input_format)
+                if os.path.isdir(file_path):
+                    reader = reader.option("basePath", file_path)
+                data = reader.load(input_paths)
+
+            if countries is not None:
+                self.logger.info(f"Pushing country filter into the {description} scan...")
+                data = data.filter(self.build_country_filter(countries))
+            if selected_columns:
+                data = data.select(selected_columns)
+
+            return self.track_row_count(data, f"Reading {description}", f"Reading {description} file completed.")
+        except Exception as file_read_error:
+            error_message = f"Error reading {description} file: {str(file_read_error)}"
+            self.logger.error(error_message)
+            raise Exception(error_message)
+
+    def load_ingestion_config(self):
+        """
+        Load input ingestion configuration from YAML file.
+
+        Returns:
+            dict: The loaded configuration from the YAML file.
+        """
+        return self.load_config('ingestion_config.yaml')
+
+    def read_sources_in_parallel(self, sources):
+        """
+        Read several input sources concurrently.
+
+        Each source is read from its own thread in the configured scheduler pool, so the
+        Spark jobs of the reads (counts, schema inference, staging) overlap on the cluster.
+        The input sizes of previous reads are reset, as the sources make up a new run.
+
+        The split size is a session setting read when the scans are planned, so it is
+        planned once from the files of all sources before the reads start, instead of by
+        each read, where the last read to finish would decide it for every scan.
+
+        Args:
+            sources (dict): The read_csv_file keyword arguments keyed by source name.
+
+        Returns:
+            dict: The DataFrames keyed by source name.
+        """
+        ingestion_config = self.load_ingestion_config()
+        spark_context = self.create_spark_session().sparkContext
+        max_workers = max(1, min(ingestion_config.get('max_concurrency', 1), len(sources)))
+        self.input_bytes = {}
+
+        input_files = []
+        for source in sources.values():
+            if self.get_input_format(source['file_path']) == 'csv':
+                input_files.extend(self.resolve_input_paths(source['file_path']))
+        self.plan_input_splits(self.create_spark_session(), input_files)
+
+        def read_source(source_name):
+            spark_context.setLocalProperty("spark.scheduler.pool", ingestion_config.get('scheduler_pool'))
+            start_time = time.perf_counter()
+            try:
+                return self.read_csv_file(**sources[source_name], plan_splits=False)
+            finally:
+                self.source_timings[source_name] = round(time.perf_counter() - start_time, 3)
+                self.logger.info(f"Source {source_name} read in {self.source_timings[source_name]}s")
+                spark_context.setLocalProperty("spark.scheduler.pool", None)
+
+        self.logger.info(f"Reading {len(sources)} sources with concurrency {max_workers}...")
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {source_name: executor.submit(read_source, source_name) for source_name in sources}
+            return {source_name: future.result() for source_name, future in futures.items()}
+
+    def load_writer_config(self):
+        """
+        Load output writer configuration from YAML file.
+
+        Returns:
+            dict: The loaded configuration from the YAML file.
+        """
+        return self.load_config('writer_config.yaml')
+
+    def get_max_records_per_file(self, data_df, target_file_size_mb):
+        """
+        Estimate the records per output file for a target file size.
+
+        The estimate uses Spark's default size of a row of the DataFrame schema.
+
+        Args:
+            data_df (DataFrame): The DataFrame to be saved.
+            target_file_size_mb (int): The target size of a single output file in MB.
+
+        Returns:
+            int: The maximum number of records per file, or None if no target is set.
+        """
+        if not target_file_size_mb:
+            return None
+        row_size_bytes = max(1, data_df._jdf.schema().defaultSize())
+        return max(1, int(target_file_size_mb * 1024 * 1024 // row_size_bytes))
+
+    def get_staging_path(self, output_path):
+        """
+        Get a staging directory next to an output path, unique to the call.
+
+        The staging directory lives on the same file system as the output, so it can be
+        committed with a rename, and concurrent or retried runs never share it.
+
+        Args:
+            output_path (str): The final output path or URI.
+
+        Returns:
+            str: The staging path.
+        """
+        return f"{output_path.rstrip('/')}._staging-{uuid.uuid4().hex}"
+
+    def delete_path(self, spark, path):
+        """
+        Recursively delete a path if it exists.
+
+        Args:
+            spark (SparkSession): The Spark session.
+            path (str): The path or URI to delete.
+        """
+        hadoop_path = spark._jvm.org.apache.hadoop.fs.Path(path)
+        file_system = hadoop_path.getFileSystem(spark._jsc.hadoopConfiguration())
+        if file_system.exists(hadoop_path):
+            file_system.delete(hadoop_path, True)
+
+    def commit_output(self, spark, staging_path, output_path):
+        """
+        Atomically move a staged output directory into place.
+
+        Uses the Hadoop FileSystem API so that local and distributed file systems are
+        handled the same way. An existing output is first renamed aside and only deleted
+        once the staged output is in place; it is restored if the final rename fails, so
+        readers see either the previous or the new output, never a partial one.
+
+        A single writer per output directory is assumed (the job server serializes jobs
+        per output). As a Hadoop rename into an existing directory nests the source inside
+        it, the commit fails instead if another writer committed the output meanwhile.
+
+        Args:
+            spark (SparkSession): The Spark session.
+            staging_path (str): The directory the executors wrote to.
+            output_path (str): The final output directory.
+
+        Raises:
+            IOError: If the staged output cannot be renamed, or if another writer committed
+                the output concurrently.
+        """
+        jvm = spark._jvm
+        hadoop_conf = spark._jsc.hadoopConfiguration()
+        source = jvm.org.apache.hadoop.fs.Path(staging_path)
+        target = jvm.org.apache.hadoop.fs.Path(output_path)
+        file_system = target.getFileSystem(hadoop_conf)
+
+        previous = None
+        if file_system.exists(target):
+            previous = jvm.org.apache.hadoop.fs.Path(f"{output_path.rstrip('/')}._previous-{uuid.uuid4().hex}")
+            if not file_system.rename(target, previous):
+                raise IOError(f"Could not move the existing output {output_path} aside")
+        elif not file_system.exists(target.getParent()):
+            file_system.mkdirs(target.getParent())
+
+        if file_system.exists(target):
+            if previous is not None:
+                file_system.delete(previous, True)
+            raise IOError(f"The output {output_path} was committed by a concurrent writer")
+        if not file_system.rename(source, target):
+            if previous is not None:
+                file_system.rename(previous, target)
+            raise IOError(f"Could not move {staging_path} to {output_path}")
+        if previous is not None:
+            file_system.delete(previous, True)
+
+    def is_local_path(self, file_path):
+        """
+        Check whether a path is on the local file system.
+
+        Args:
+            file_path (str): The path or URI.
+
+        Returns:
+            bool: True for plain paths (including Windows drive paths) and file:// URIs.
+        """
+        scheme = urlparse(file_path).scheme
+        return scheme in ('', 'file') or len(scheme) == 1
+
+    def estimate_output_size(self, data_df):
+        """
+        Estimate the size of the output of the run.
+
+        The output rows combine input rows matched on their id, so the total size of the
+        input files read by the run approximates its size. The Catalyst estimate is only used
+        when an input size is unknown (remote or Parquet/ORC inputs, or a DataFrame that
+        was not read from files), as it multiplies the sizes of the join inputs without
+        cost-based statistics and so overestimates joined outputs by orders of magnitude.
+
+        Args:
+            data_df (DataFrame): The DataFrame to be saved.
+
+        Returns:
+            int: The estimated size in bytes.
+        """
+        if self.input_bytes and None not in self.input_bytes.values():
+            return sum(self.input_bytes.values())
+        return self.estimate_size_in_bytes(data_df)
+
+    def export_on_driver(self, data_df, file_path, writer_config):
+        """
+        Export a small DataFrame on the driver from streamed Arrow record batches.
+
+        The executors serialize each partition into Arrow IPC record batches of at most
+        chunk_rows rows, which the driver fetches one partition at a time and appends to
+        a single Parquet or CSV file, so the result is never collected at once.
+
+        Args:
+            data_df (DataFrame): The DataFrame to be saved.
+            file_path (str): The path of the output directory.
+            writer_config (dict): The writer configuration.
+
+        Returns:
+            bool: True if the output was exported, False if the distributed writer must be used.
+        """
+        export_config = writer_config.get('driver_export', {})
+        if not export_config.get('enabled'):
+            return False
+
+        output_format = writer_config.get('output_format', 'csv')
+        compression = writer_config.get('compression') or 'none'
+        if (writer_config.get('partition_by') or output_format not in ('parquet', 'csv')
+                or (output_format == 'csv' and compression != 'none') or not self.is_local_path(file_path)):
+            self.logger.info("Driver export does not support this output, using the distributed writer.")
+            return False
+
+        estimated_size = self.estimate_output_size(data_df)
+        if estimated_size > export_config.get('max_bytes', 0):
+            self.logger.info(f"Estimated output size {estimated_size} bytes is above the driver export limit, using the distributed writer.")
+            return False
+
+        try:
+            import pyarrow as pa
+            import pyarrow.csv as pa_csv
+            import pyarrow.parquet as pa_parquet
+            from pyspark.sql.pandas.types import to_arrow_schema
+        except ImportError:
+            self.logger.warning("pyarrow is not installed, using the distributed writer.")
+            return False
+
+        def serialize_batches(batches):
+            import pyarrow as pa
+            for batch in batches:
+                sink = pa.BufferOutputStream()
+                with pa.ipc.new_stream(sink, batch.schema) as ipc_writer:
+                    ipc_writer.write_batch(batch)
+                yield pa.RecordBatch.from_pydict({"arrow_ipc": [sink.getvalue().to_pybytes()]})
+
+        spark = self.create_spark_session()
+        self.set_session_conf("spark.sql.execution.arrow.maxRecordsPerBatch", str(export_config.get('chunk_rows', 100000)))
+        arrow_schema = to_arrow_schema(data_df.schema)
+
+        local_path = urlparse(file_path).path if file_path.startswith('file:') else file_path
+        staging_path = self.get_staging_path(local_path)
+        os.makedirs(staging_path)
+        part_path = os.path.join(staging_path, f"part-00000.{output_format}")
+
+        try:
+            if output_format == 'parquet':
+                file_writer = pa_parquet.ParquetWriter(part_path, arrow_schema, compression=None if compression == 'none' else compression)
+            else:
+                include_header = writer_config.get('csv_options', {}).get('header', True)
+                file_writer = pa_csv.CSVWriter(part_path, arrow_schema, write_options=pa_csv.WriteOptions(include_header=include_header, quoting_style='needed'))
+
+            row_count = 0
+            with file_writer:
+                for row in data_df.mapInArrow(serialize_batches, "arrow_ipc binary").toLocalIterator(prefetchPartitions=True):
+                    for batch in pa.ipc.open_stream(row.arrow_ipc):
+                        file_writer.write_batch(batch)
+                        row_count += batch.num_rows
+            open(os.path.join(staging_path, '_SUCCESS'), 'w').close()
+
+            self.commit_output(spark, staging_path, local_path)
+        finally:
+            shutil.rmtree(staging_path, ignore_errors=True)
+        self.logger.info(f"Exported {row_count} rows on the driver.")
+        return True
+
+    @instrumented_stage("save_to_file")
+    def save_to_file(self, data_df, file_path, partition_by=None):
+        """
+        Save DataFrame with the distributed output writer.
+
+        The executors write the output in the configured format, partitioning and
+        compression into a staging directory, which is then committed to file_path.
+        Small outputs are exported on the driver instead when driver export is enabled.
+
+        Args:
+            data_df (DataFrame): The DataFrame to be saved.
+            file_path (str): The path of the output directory.
+            partition_by (list): Columns the output is partitioned by first, ahead of the
+                configured partition columns.
+
+        Raises:
+            Exception: If an error occurs during file saving.
+        """
+        try:
+            self.logger.info(f"Saving data to {file_path}...")
+            writer_config = self.load_writer_config()
+            if partition_by:
+                writer_config = dict(writer_config, partition_by=list(partition_by) + [
+                    column for column in writer_config.get('partition_by', []) if column not in partition_by
+                ])
+            output_format = writer_config.get('output_format', 'csv')
+            if output_format not in SUPPORTED_OUTPUT_FORMATS:
+                raise ValueError(f"Unsupported output format: {output_format}")
+
+            if self.export_on_driver(data_df, file_path, writer_config):
+                self.logger.info(f"Saving data to {file_path} completed successfully.")
+                return
+
+            writer = data_df.write.mode('overwrite').format(output_format)
+            if writer_config.get('compression'):
+                writer = writer.option('compression', writer_config['compression'])
+            if writer_config.get('partition_by'):
+                writer = writer.partitionBy(*writer_config['partition_by'])
+            max_records_per_file = self.get_max_records_per_file(data_df, writer_config.get('target_file_size_mb'))
+            if max_records_per_file:
+                writer = writer.option('maxRecordsPerFile', max_records_per_file)
+            if output_format == 'csv':
+                writer = writer.options(**writer_config.get('csv_options', {}))
+
+            spark = self.create_spark_session()
+            staging_path = self.get_staging_path(file_path)
+            try:
+                writer.save(staging_path)
+                self.commit_output(spark, staging_path, file_path)
+            finally:
+                self.delete_path(spark, staging_path)
+            self.logger.info(f"Saving data to {file_path} completed successfully.")
+        except Exception as save_error:
+            error_message = f"Error saving data to {file_path}: {str(save_error)}"
+            self.logger.error(error_message)
+            raise Exception(error_message)
+
+    def load_incremental_config(self):
+        """
+        Load incremental processing configuration from YAML file.
+
+        Returns:
+            dict: The loaded configuration from the YAML file.
+        """
+        return self.load_config('incremental_config.yaml')
+
+    def hash_rows_by_id(self, data_df, hash_column, separator):
+        """
+        Compute a content hash per id of a DataFrame.
+
+        Ids with several rows get a single hash over the sorted row hashes. Nulls are hashed
+        as a NUL character, since concat_ws skips them and a value moving between nullable
+        columns would otherwise keep the same hash.
+
+        Args:
+            data_df (DataFrame): The DataFrame with an id column.
+            hash_column (str): The name of the resulting hash column.
+            separator (str): The separator used when concatenating column values.
+
+        Returns:
+            DataFrame: A DataFrame with the id and hash_column columns.
+        """
+        row_hash = sha2(concat_ws(separator, *[
+            coalesce(col(name).cast("string"), lit("\u0000")) for name in data_df.columns
+        ]), 256)
+        return (
+            data_df.select("id", row_hash.alias("row_hash"))
+            .groupBy("id")
+            .agg(sha2(concat_ws(",", sort_array(collect_list("row_hash"))), 256).alias(hash_column))
+        )
+
+    def path_exists(self, spark, path):
+        """
+        Check whether a path exists, on any file system supported by Hadoop.
+
+        Args:
+            spark (SparkSession): The Spark session.
+            path (str): The path or URI.
+
+        Returns:
+            bool: True if the path exists.
+        """
+        target = spark._jvm.org.apache.hadoop.fs.Path(path)
+        return target.getFileSystem(spark._jsc.hadoopConfiguration()).exists(target)
+
+    def get_incremental_state_path(self, output_path, countries):
+        """
+        Get the state directory of an incremental output.
+
+        The state is keyed by the output path and the country list, so runs writing
+        another output or filtering other countries never share hashes.
+
+        Args:
+            output_path (str): The output directory.
+            countries (list): List of countries to filter.
+
+        Returns:
+            str: The absolute path to the state directory.
+        """
+        incremental_config = self.load_incremental_config()
+        state_key = hashlib.sha256(json.dumps({
+            'output_path': os.path.abspath(output_path) if self.is_local_path(output_path) else output_path,
+            'countries': sorted(set(countries)),
+        }, sort_keys=True).encode('utf-8')).hexdigest()
+        return os.path.join(self.get_project_root(), incremental_config.get('state_dir', 'state'), state_key)
+
+    def read_incremental_state(self, spark, state_path, output_path, countries):
+        """
+        Read the per-id hashes of the previous incremental run.
+
+        The state is only usable when the output it describes still exists and was
+        written for the same countries; otherwise the run must process all ids.
+
+        Args:
+            spark (SparkSession): The Spark session.
+            state_path (str): The state directory.
+            output_path (str): The output directory.
+            countries (list): List of countries to filter.
+
+        Returns:
+            DataFrame: The previous state, or None if all ids must be processed.
+        """
+        state_info_path = os.path.join(state_path, INCREMENTAL_STATE_INFO_FILE)
+        if not os.path.exists(state_info_path):
+            self.logger.info("No incremental state found, processing all ids.")
+            return None
+        with open(state_info_path, 'r') as state_info_file:
+            state_info = json.load(state_info_file)
+        if state_info.get('countries') != sorted(set(countries)):
+            self.logger.info("Incremental state was written for other countries, processing all ids.")
+            return None
+        if not self.path_exists(spark, output_path):
+            self.logger.info(f"Output {output_path} of the incremental state is missing, processing all ids.")
+            return None
+        return spark.read.parquet(state_path)
+
+    def read_existing_output(self, spark, output_path, schema):
+        """
+        Read a previously written output dataset.
+
+        Args:
+            spark (SparkSession): The Spark session.
+            output_path (str): The output directory.
+            schema (StructType): The schema of the output.
+
+        Returns:
+            DataFrame: The existing output, or None if there is no output yet.
+        """
+        if not self.path_exists(spark, output_path):
+            return None
+
+        writer_config = self.load_writer_config()
+        reader = spark.read.schema(schema).format(writer_config.get('output_format', 'csv'))
+        if writer_config.get('output_format', 'csv') == 'csv':
+            reader = reader.options(**writer_config.get('csv_options', {}))
+        return reader.load(output_path)
+
+    def process_data_incremental(self, spark, clients_file, financials_file, countries, output_path):
+        """
+        Process only new or changed ids and merge them into the existing output.
+
+        The state directory of the output and country list keeps a content hash per id
+        for both inputs. Ids whose hashes changed, or which are new, are filtered, joined
+        and renamed; the existing output rows of changed and removed ids are replaced by
+        the new rows. Without a usable state all ids are processed and the output is
+        rewritten.
+
+        Args:
+            spark (SparkSession): The Spark session.
+            clients_file (str): Path to the clients dataset file.
+            financials_file (str): Path to the financials dataset file.
+            countries (list): List of countries to filter.
+            output_path (str): The output directory.
+        """
+        incremental_config = self.load_incremental_config()
+        separator = incremental_config.get('hash_separator', '\u001f')
+        state_path = self.get_incremental_state_path(output_path, countries)
+
+        column_selection_config = self.load_column_selection_config()
+        sources = self.read_sources_in_parallel({
+            'clients': {'file_path': clients_file, 'description': "Clients",
+                        'selected_columns': column_selection_config.get('clients_columns', []), 'dataset': "clients"},
+            'financials': {'file_path': financials_file, 'description': "Financials",
+                           'selected_columns': column_selection_config.get('financials_columns', []), 'dataset': "financials"},
+        })
+        clients = sources['clients']
+        financials = sources['financials']
+
+        current_state = self.hash_rows_by_id(clients, "clients_hash", separator).join(
+            self.hash_rows_by_id(financials, "financials_hash", separator), on="id", how="full_outer"
+        ).fillna("", subset=["clients_hash", "financials_hash"])
+        previous_state = self.read_incremental_state(spark, state_path, output_path, countries)
+
+        if previous_state is None:
+            changed_ids = current_state.select("id")
+            affected_ids = changed_ids
+        else:
+            changed_ids = current_state.join(
+                previous_state, on=["id", "clients_hash", "financials_hash"], how="left_anti"
+            ).select("id")
+            removed_ids = previous_state.join(current_state, on="id", how="left_anti").select("id")
+            affected_ids = changed_ids.union(removed_ids)
+
+        changed_clients = self.filter_data(clients.join(changed_ids, on="id", how="left_semi"), countries)
+        changed_financials = financials.join(changed_ids, on="id", how="left_semi")
+        changed_clients, changed_financials = self.prune_join_inputs(changed_clients, changed_financials)
+        changed_result = self.rename_columns(self.join_datasets(changed_clients, changed_financials))
+
+        key_column = self.get_renamed_column("id")
+        existing_output = None
+        if previous_state is not None:
+            existing_output = self.read_existing_output(spark, output_path, changed_result.schema)
+        if existing_output is not None:
+            affected_keys = affected_ids.withColumnRenamed("id", key_column)
+            changed_result = existing_output.join(affected_keys, on=key_column, how="left_anti").unionByName(changed_result)
+
+        self.save_to_file(changed_result, output_path)
+
+        temporary_state_path = self.get_staging_path(state_path)
+        try:
+            current_state.write.parquet(temporary_state_path)
+            with open(os.path.join(temporary_state_path, INCREMENTAL_STATE_INFO_FILE), 'w') as state_info_file:
+                json.dump({'output_path': output_path, 'countries': sorted(set(countries))}, state_info_file)
+            self.commit_output(spark, temporary_state_path, state_path)
+        finally:
+            self.delete_path(spark, temporary_state_path)
+        self.logger.info(f"Incremental state updated in {state_path}.")
+
+    def process_data(self, clients_file, financials_file, countries, output_path=DEFAULT_OUTPUT_PATH):
+        """
+        Process client and financial data and perform filtering, joining, and renaming.
+
+        Args:
+            clients_file (str): Path to the clients dataset file.
+            financials_file (str): Path to the financials dataset file.
+            countries (list): List of countries to filter.
+            output_path (str): The output directory, as a local path or a URI (e.g. hdfs://).
+
+        Raises:
+            AnalysisException: If a Spark AnalysisException occurs.
+            Exception: If an unexpected error occurs.
+        """
+        try:
+            if not self.incremental and self.choose_engine(clients_file, financials_file, output_path) == 'local':
+                self.process_data_local(clients_file, financials_file, countries, output_path)
+                self.logger.info("Data processing completed successfully.")
+                self.log_metrics_summary()
+                return
+
+            spark = self.create_spark_session()
+            if self.incremental:
+                self.process_data_incremental(spark, clients_file, financials_file, countries, output_path)
+                if self.lazy:
+                    self.log_stage_row_counts()
+                self.logger.info("Incremental data processing completed successfully.")
+                self.log_metrics_summary()
+                return
+
+            column_selection_config = self.load_column_selection_config()
+            sources = self.read_sources_in_parallel({
+                'clients': {'file_path': clients_file, 'description': "Clients",
+                            'selected_columns': column_selection_config.get('clients_columns', []),
+                            'dataset': "clients", 'countries': countries},
+                'financials': {'file_path': financials_file, 'description': "Financials",
+                               'selected_columns': column_selection_config.get('financials_columns', []),
+                               'dataset': "financials"},
+            })
+            filtered_data, financials = self.prune_join_inputs(sources['clients'], sources['financials'])
+            filtered_data = self.persist_stage(filtered_data, "filtered_data")
+            financials = self.apply_runtime_filter(filtered_data, financials)
+            joined_data = self.repartition_skew_aware(self.join_datasets(filtered_data, financials))
+            result_data = self.rename_columns(joined_data)
+            if not self.lazy:
+                result_data.show()
+            self.save_to_file(result_data, output_path)
+            self.log_stage_row_counts()
+            self.logger.info("Data processing completed successfully.")
+            self.log_metrics_summary()
+        except AnalysisException as ae:
+            self.logger.error(f"Spark AnalysisException: {str(ae)}")
+            raise AnalysisException(f"Spark AnalysisException: {str(ae)}")
+        except Exception as e:
+            self.logger.error(f"Unexpected error: {str(e)}")
+            raise Exception(f"Unexpected error: {str(e)}")
+        finally:
+            self.release_persisted_data()
+            self.restore_session_conf()
+
+    def load_fan_out_config(self):
+        """
+        Load country group fan-out configuration from YAML file.
+
+        Returns:
+            dict: The loaded configuration from the YAML file.
+        """
+        return self.load_config('fan_out_config.yaml')
+
+    def process_data_fan_out(self, clients_file, financials_file, country_groups, output_path=DEFAULT_OUTPUT_PATH):
+        """
+        Process several country groups with a single read, join and write.
+
+        The inputs are read and joined once for the union of all countries. Every row
+        is then tagged with each group its country belongs to, and the result is written
+        in one pass partitioned by the group column, so each group's extract is the
+        <group_column>=<name> directory of the output. Row counts per group are
+        collected by an Observation during the write.
+
+        Args:
+            clients_file (str): Path to the clients dataset file.
+            financials_file (str): Path to the financials dataset file.
+            country_groups (dict): The countries of every group, keyed by group name.
+            output_path (str): The output directory, as a local path or a URI (e.g. hdfs://).
+
+        Raises:
+            AnalysisException: If a Spark AnalysisException occurs.
+            Exception: If an unexpected error occurs.
+        """
+        try:
+            if not country_groups:
+                raise ValueError("No country groups given")
+            group_column = self.load_fan_out_config()['group_column']
+            all_countries = sorted({country for countries in country_groups.values() for country in countries})
+            self.logger.info(f"Fan-out over {len(country_groups)} country groups: {sorted(country_groups)}")
+
+            column_selection_config = self.load_column_selection_config()
+            sources = self.read_sources_in_parallel({
+                'clients': {'file_path': clients_file, 'description': "Clients",
+                            'selected_columns': column_selection_config.get('clients_columns', []),
+                            'dataset': "clients", 'countries': all_countries},
+                'financials': {'file_path': financials_file, 'description': "Financials",
+                               'selected_columns': column_selection_config.get('financials_columns', []),
+                               'dataset': "financials"},
+            })
+            filtered_data, financials = self.prune_join_inputs(sources['clients'], sources['financials'])
+            filtered_data = self.persist_stage(filtered_data, "filtered_data")
+            financials = self.apply_runtime_filter(filtered_data, financials)
+            joined_data = self.join_datasets(filtered_data, financials)
+
+            group_names = array(*[
+                when(col("country").isin(countries), lit(name)) for name, countries in country_groups.items()
+            ])
+            grouped_data = joined_data.withColumn(group_column, explode(group_names)).filter(col(group_column).isNotNull())
+            result_data = self.rename_columns(grouped_data)
+
+            group_observation = Observation("country_groups")
+            result_data = result_data.observe(group_observation, *[
+                count(when(col(group_column) == name, True)).alias(name) for name in country_groups
+            ])
+            self.save_to_file(result_data, output_path, partition_by=[group_column])
+            for name, row_count in group_observation.get.items():
+                self.logger.info(f"Country group {name} - Rows: {row_count}")
+            self.log_stage_row_counts()
+            self.logger.info("Fan-out data processing completed successfully.")
+            self.log_metrics_summary()
+        except AnalysisException as ae:
+            self.logger.error(f"Spark AnalysisException: {str(ae)}")
+            raise AnalysisException(f"Spark AnalysisException: {str(ae)}")
+        except Exception as e:
+            self.logger.error(f"Unexpected error: {str(e)}")
+            raise Exception(f"Unexpected error: {str(e)}")
+        finally:
+            self.release_persisted_data()
+            self.restore_session_conf()
+
+    def load_engine_config(self):
+        """
+        Load execution engine configuration from YAML file.
+
+        Returns:
+            dict: The loaded configuration from the YAML file.
+        """
+        return self.load_config('engine_config.yaml')
+
+    def get_local_engine_blocker(self, input_files, output_path):
+        """
+        Find the reason the local engine cannot run a job.
+
+        Args:
+            input_files (list): The (path, size) of all input files.
+            output_path (str): The output directory.
+
+        Returns:
+            str: The reason, or None if the local engine supports the job.
+        """
+        writer_config = self.load_writer_config()
+        if self.incremental:
+            return "incremental processing"
+        if writer_config.get('output_format', 'csv') != 'csv' or (writer_config.get('compression') or 'none') != 'none':
+            return "only uncompressed CSV output is supported"
+        if writer_config.get('partition_by'):
+            return "partitioned output"
+        if writer_config.get('driver_export', {}).get('enabled'):
+            return "driver export is enabled"
+        if set(writer_config.get('csv_options', {})) - {'header'}:
+            return "CSV options other than header"
+        if not self.is_local_path(output_path) or urlparse(output_path).scheme == 'file':
+            return f"output {output_path} is not a local path"
+        for path, size in input_files:
+            if size is None or urlparse(path).scheme == 'file' or self.get_input_format(path) != 'csv':
+                return f"input {path} is not a local CSV file"
+
+        datasets = self.load_schema_registry_config().get('datasets', {})
+        for dataset in ('clients', 'financials'):
+            if not datasets.get(dataset):
+                return f"dataset {dataset} is not in the schema registry"
+            unsupported_columns = [
+                field['name'] for field in datasets[dataset]
+                if field['type'] != 'string' and field['type'] not in LOCAL_ENGINE_INTEGER_RANGES
+            ]
+            if unsupported_columns:
+                return f"unsupported column types of {dataset}: {unsupported_columns}"
+        return None
+
+    def choose_engine(self, clients_file, financials_file, output_path):
+        """
+        Choose the execution engine of a job.
+
+        In auto mode the local engine is used when it supports the job and the inputs
+        total at most local_max_input_mb, since a Spark session would then take longer
+        to start than the processing itself.
+
+        Args:
+            clients_file (str): Path to the clients dataset file.
+            financials_file (str): Path to the financials dataset file.
+            output_path (str): The output directory.
+
+        Returns:
+            str: "spark" or "local".
+
+        Raises:
+            ValueError: If the local engine is requested but does not support the job.
+        """
+        engine_config = self.load_engine_config()
+        engine = self.engine or engine_config.get('engine', 'auto')
+        if engine == 'spark':
+            return 'spark'
+
+        input_files = self.resolve_input_paths(clients_file) + self.resolve_input_paths(financials_file)
+        blocker = self.get_local_engine_blocker(input_files, output_path)
+        if engine == 'local':
+            if blocker:
+                raise ValueError(f"The local engine cannot run this job: {blocker}")
+            return 'local'
+        if blocker:
+            self.logger.info(f"Engine: spark ({blocker}).")
+            return 'spark'
+
+        input_bytes = sum(size for _, size in input_files)
+        if input_bytes > engine_config.get('local_max_input_mb', 0) * 1024 * 1024:
+            self.logger.info(f"Engine: spark (input of {input_bytes} bytes is above local_max_input_mb).")
+            return 'spark'
+        self.logger.info(f"Engine: local (input of {input_bytes} bytes).")
+        return 'local'
+
+    def parse_local_value(self, value, field_type):
+        """
+        Parse a CSV field like Spark's CSV reader for a registry type.
+
+        Empty fields are null, and integers that are malformed or out of range are
+        null, as in Spark's permissive mode.
+
+        Args:
+            value (str): The raw field, or None if the row has fewer fields.
+            field_type (str): The registry type: "string", "integer" or "long".
+
+        Returns:
+            The parsed value, or None.
+        """
+        if value is None or value == '':
+            return None
+        if field_type == 'string':
+            return value
+
+        digits = value[1:] if value[0] in '+-' else value
+        if not (digits.isascii() and digits.isdigit()):
+            return None
+        number = int(value)
+        minimum, maximum = LOCAL_ENGINE_INTEGER_RANGES[field_type]
+        return number if minimum <= number <= maximum else None
+
+    def format_local_csv_value(self, value):
+        """
+        Format a value like Spark's CSV writer with its default options.
+
+        Nulls are written as empty fields and empty strings as "". Strings are trimmed
+        and quoted when they contain a comma, quote or line break, with quotes escaped
+        by a backslash.
+
+        Args:
+            value: The value to be written.
+
+        Returns:
+            str: The CSV field.
+        """
+        if value is None:
+            return ''
+        if not isinstance(value, str):
+            return str(value)
+        if value == '':
+            return '""'
+        text = value.strip(CSV_WRITER_TRIM_CHARACTERS)
+        if any(character in text for character in ',"\n\r'):
+            return '"' + text.replace('"', '\\"') + '"'
+        return text
+
+    def read_csv_local(self, file_path, description, selected_columns, dataset, countries=None):
+        """
+        Read, filter and select the columns of a CSV input with the csv module.
+
+        Fields are mapped to the registry schema by position, as Spark does for a
+        header row with an explicit schema.
+
+        Args:
+            file_path (str): The path, glob, directory or manifest of the input.
+            description (str): A description of the data being read.
+            selected_columns (list): List of column names to select.
+            dataset (str): The dataset key in the schema registry (e.g. "clients").
+            countries (list): List of countries to filter, or None to keep all rows.
+
+        Returns:
+            tuple: The selected column names and the list of row tuples.
+        """
+        self.logger.info(f"Reading {description} file locally...")
+        fields = self.load_schema_registry_config()['datasets'][dataset]
+        field_names = [field['name'] for field in fields]
+        selected_columns = selected_columns or field_names
+        selected_positions = [field_names.index(column) for column in selected_columns]
+        country_position = field_names.index('country') if countries is not None else None
+        countries = set(countries or [])
+
+        rows = []
+        for input_path, _ in self.resolve_input_paths(file_path):
+            with open(input_path, 'r', encoding='utf-8', newline='') as input_file:
+                reader = csv.reader(input_file, escapechar='\\')
+                next(reader, None)
+                for record in reader:
+                    record = record + [None] * (len(fields) - len(record))
+                    values = [self.parse_local_value(record[position], field['type']) for position, field in enumerate(fields)]
+                    if country_position is not None and values[country_position] not in countries:
+                        continue
+                    rows.append(tuple(values[position] for position in selected_positions))
+
+        self.logger.info(f"Reading {description} file completed. Rows: {len(rows)}")
+        return list(selected_columns), rows
+
+    def run_local_stage(self, stage_name, stage_function):
+        """
+        Run and record one stage of the local engine.
+
+        Args:
+            stage_name (str): The name of the stage.
+            stage_function (callable): Runs the stage.
+
+        Returns:
+            The result of stage_function.
+        """
+        started_at = datetime.now(timezone.utc).isoformat()
+        start_time = time.perf_counter()
+        try:
+            return stage_function()
+        finally:
+            self.record_stage_metrics(stage_name, "local", started_at, time.perf_counter() - start_time, None)
+
+    def commit_local_output(self, staging_path, output_path):
+        """
+        Atomically move a staged local output directory into place.
+
+        An existing output is first renamed aside and only deleted once the staged
+        output is in place; it is restored if the final rename fails.
+
+        Args:
+            staging_path (str): The directory the output was written to.
+            output_path (str): The final output directory.
+        """
+        previous_path = None
+        if os.path.exists(output_path):
+            previous_path = f"{output_path.rstrip(os.sep)}._previous-{uuid.uuid4().hex}"
+            os.rename(output_path, previous_path)
+        else:
+            os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+
+        try:
+            os.rename(staging_path, output_path)
+        except OSError:
+            if previous_path is not None:
+                os.rename(previous_path, output_path)
+            raise
+        if previous_path is not None:
+            shutil.rmtree(previous_path)
+
+    def write_csv_local(self, columns, rows, output_path):
+        """
+        Write rows as a single CSV part file like Spark's CSV writer.
+
+        The part file and a _SUCCESS marker are written to a staging directory, which
+        is then committed to output_path.
+
+        Args:
+            columns (list): The column names.
+            rows (list): The row tuples.
+            output_path (str): The output directory.
+        """
+        self.logger.info(f"Saving data to {output_path}...")
+        writer_config = self.load_writer_config()
+        staging_path = self.get_staging_path(output_path)
+        os.makedirs(staging_path)
+        try:
+            part_path = os.path.join(staging_path, f"part-00000-{uuid.uuid4()}-c000.csv")
+            with open(part_path, 'w', encoding='utf-8', newline='') as part_file:
+                if writer_config.get('csv_options', {}).get('header'):
+                    part_file.write(','.join(self.format_local_csv_value(column) for column in columns) + '\n')
+                for row in rows:
+                    part_file.write(','.join(self.format_local_csv_value(value) for value in row) + '\n')
+            open(os.path.join(staging_path, '_SUCCESS'), 'w').close()
+            self.commit_local_output(staging_path, output_path)
+        finally:
+            if os.path.exists(staging_path):
+                shutil.rmtree(staging_path)
+        self.logger.info(f"Saving data to {output_path} completed successfully.")
+
+    def process_data_local(self, clients_file, financials_file, countries, output_path):
+        """
+        Process client and financial data on the driver without a Spark session.
+
+        Runs the read, filter, join, rename and save steps of process_data with the csv
+        module, without the JVM startup. The output holds the same header and rows as the
+        Spark path, formatted the same way, but it is not byte-identical: it is a single
+        part file, while Spark may write several, each with its own header, and the row
+        order is not fixed.
+
+        Args:
+            clients_file (str): Path to the clients dataset file.
+            financials_file (str): Path to the financials dataset file.
+            countries (list): List of countries to filter.
+            output_path (str): The output directory.
+        """
+        column_selection_config = self.load_column_selection_config()
+        clients_columns, clients_rows = self.run_local_stage("read_csv_file", lambda: self.read_csv_local(
+            clients_file, "Clients", column_selection_config.get('clients_columns', []), "clients", countries
+        ))
+        financials_columns, financials_rows = self.run_local_stage("read_csv_file", lambda: self.read_csv_local(
+            financials_file, "Financials", column_selection_config.get('financials_columns', []), "financials"
+        ))
+
+        def join():
+            self.logger.info("Joining datasets...")
+            kept_clients_columns, kept_financials_columns = self.get_pruned_join_columns(clients_columns, financials_columns)
+            client_positions = [clients_columns.index(column) for column in kept_clients_columns]
+            financial_positions = [financials_columns.index(column) for column in kept_financials_columns if column != "id"]
+            clients_id_position = clients_columns.index("id")
+            financials_id_position = financials_columns.index("id")
+
+            clients_by_id = {}
+            for client_row in clients_rows:
+                if client_row[clients_id_position] is not None:
+                    clients_by_id.setdefault(client_row[clients_id_position], []).append(
+                        tuple(client_row[position] for position in client_positions)
+                    )
+            joined_rows = [
+                client_row + tuple(financial_row[position] for position in financial_positions)
+                for financial_row in financials_rows
+                for client_row in clients_by_id.get(financial_row[financials_id_position], ())
+            ]
+            self.logger.info(f"Joining datasets completed. Rows: {len(joined_rows)}")
+            return kept_clients_columns + [financials_columns[position] for position in financial_positions], joined_rows
+
+        joined_columns, joined_rows = self.run_local_stage("join_datasets", join)
+
+        def rename():
+            self.logger.info("Renaming columns...")
+            rename_plan = self.get_rename_plan(joined_columns)
+            positions = [joined_columns.index(source) for source, _ in rename_plan]
+            renamed_rows = [tuple(row[position] for position in positions) for row in joined_rows]
+            self.logger.info("Column renaming completed.")
+            return [new_name for _, new_name in rename_plan], renamed_rows
+
+        result_columns, result_rows = self.run_local_stage("rename_columns", rename)
+        self.run_local_stage("save_to_file", lambda: self.write_csv_local(result_columns, result_rows, output_path))
+
+    def load_streaming_config(self):
+        """
+        Load streaming configuration from YAML file.
+
+        Returns:
+            dict: The loaded configuration from the YAML file.
+        """
+        return self.load_config('streaming_config.yaml')
+
+    def read_csv_stream(self, spark, directory, description, selected_columns, dataset):
+        """
+        Read new CSV files of a directory as a stream.
+
+        Args:
+            spark (SparkSession): The Spark session.
+            directory (str): The directory watched for new CSV files.
+            description (str): A description of the data being read.
+            selected_columns (list): List of column names to select.
+            dataset (str): The dataset key in the schema registry (e.g. "clients").
+
+        Returns:
+            DataFrame: The streaming DataFrame.
+        """
+        self.logger.info(f"Watching {directory} for new {description} files...")
+        schema = self.build_schema(dataset) or self.infer_schema(spark, directory, dataset)
+        stream_df = (
+            spark.readStream
+            .schema(schema)
+            .option("header", True)
+            .option("maxFilesPerTrigger", self.load_streaming_config().get('max_files_per_trigger', 100))
+            .csv(directory)
+        )
+        if selected_columns:
+            stream_df = stream_df.select(selected_columns)
+        return stream_df
+
+    def get_streaming_checkpoint_path(self, clients_dir, financials_dir, countries, output_path):
+        """
+        Get the default checkpoint directory of a streaming query.
+
+        The checkpoint is keyed by the watched directories, the country list and the output
+        path, so a query over other inputs or writing another output never resumes the
+        offsets and file sink log of a different query.
+
+        Args:
+            clients_dir (str): The directory watched for new client files.
+            financials_dir (str): The directory watched for new financial files.
+            countries (list): List of countries to filter.
+            output_path (str): The output directory.
+
+        Returns:
+            str: The absolute path to the checkpoint directory.
+        """
+        streaming_config = self.load_streaming_config()
+        checkpoint_key = hashlib.sha256(json.dumps({
+            'clients_dir': os.path.abspath(clients_dir) if self.is_local_path(clients_dir) else clients_dir,
+            'financials_dir': os.path.abspath(financials_dir) if self.is_local_path(financials_dir) else financials_dir,
+            'countries': sorted(set(countries)),
+            'output_path': os.path.abspath(output_path) if self.is_local_path(output_path) else output_path,
+        }, sort_keys=True).encode('utf-8')).hexdigest()
+        return os.path.join(self.get_project_root(), streaming_config.get('checkpoint_dir', 'checkpoints'), checkpoint_key)
+
+    def process_data_streaming(self, clients_dir, financials_dir, countries, output_path, checkpoint_path=None):
+        """
+        Continuously process new client and financial files with a stream-stream join.
+
+        Rows of both inputs are kept in the join state keyed by id for state_ttl after
+        they were ingested, so a client and its financials match when they land within
+        that time of each other. The joined rows are filtered, renamed and appended to
+        the output by the file sink, whose checkpoint gives exactly-once output.
+
+        Args:
+            clients_dir (str): The directory watched for new client files.
+            financials_dir (str): The directory watched for new financial files.
+            countries (list): List of countries to filter.
+            output_path (str): The output directory.
+            checkpoint_path (str): The checkpoint directory, or None for the default of
+                get_streaming_checkpoint_path.
+
+        Raises:
+            AnalysisException: If a Spark AnalysisException occurs.
+            Exception: If an unexpected error occurs.
+        """
+        try:
+            spark = self.create_spark_session()
+            streaming_config = self.load_streaming_config()
+            state_ttl = streaming_config['state_ttl']
+            checkpoint_path = checkpoint_path or self.get_streaming_checkpoint_path(clients_dir, financials_dir, countries, output_path)
+
+            column_selection_config = self.load_column_selection_config()
+            clients = self.read_csv_stream(spark, clients_dir, "Clients", column_selection_config.get('clients_columns', []), "clients")
+            clients = clients.filter(self.build_country_filter(countries))
+            financials = self.read_csv_stream(spark, financials_dir, "Financials", column_selection_config.get('financials_columns', []), "financials")
+            clients, financials = self.prune_join_inputs(clients, financials)
+            clients = clients.withColumn("clients_ingest_time", current_timestamp()).withWatermark("clients_ingest_time", state_ttl)
+            financials = financials.withColumn("financials_ingest_time", current_timestamp()).withWatermark("financials_ingest_time", state_ttl)
+
+            join_condition = expr(
+                f"clients.id = financials.id AND "
+                f"financials.financials_ingest_time >= clients.clients_ingest_time - INTERVAL {state_ttl} AND "
+                f"financials.financials_ingest_time <= clients.clients_ingest_time + INTERVAL {state_ttl}"
+            )
+            joined_data = clients.alias("clients").join(financials.alias("financials"), join_condition).select(
+                *[col(f"clients.`{column}`") for column in clients.columns if column != "clients_ingest_time"],
+                *[col(f"financials.`{column}`") for column in financials.columns if column not in ("id", "financials_ingest_time")]
+            )
+            result_data = self.rename_columns(joined_data)
+
+            writer_config = self.load_writer_config()
+            writer = (
+                result_data.writeStream
+                .format(writer_config.get('output_format', 'csv'))
+                .outputMode("append")
+                .option("path", output_path)
+                .option("checkpointLocation", checkpoint_path)
+            )
+            if writer_config.get('output_format', 'csv') == 'csv':
+                writer = writer.options(**writer_config.get('csv_options', {}))
+            if writer_config.get('partition_by'):
+                writer = writer.partitionBy(*writer_config['partition_by'])
+            if streaming_config.get('available_now'):
+                writer = writer.trigger(availableNow=True)
+            else:
+                writer = writer.trigger(processingTime=streaming_config.get('trigger_interval', '30 seconds'))
+
+            query = writer.start()
+            self.logger.info(f"Streaming query {query.id} started, writing to {output_path}.")
+            query.awaitTermination()
+            self.logger.info("Streaming query completed.")
+        except AnalysisException as ae:
+            self.logger.error(f"Spark AnalysisException: {str(ae)}")
+            raise AnalysisException(f"Spark AnalysisException: {str(ae)}")
+        except Exception as e:
+            self.logger.error(f"Unexpected error: {str(e)}")
+            raise Exception(f"Unexpected error: {str(e)}")
+
+    def load_server_config(self):
+        """
+        Load job server configuration from YAML file.
+
+        Returns:
+            dict: The loaded configuration from the YAML file.
+        """
+        return self.load_config('server_config.yaml')
+
+    def get_output_lock(self, output_path):
+        """
+        Get the lock serializing the jobs of the job server that write the same output.
+
+        Args:
+            output_path (str): The output directory of the job.
+
+        Returns:
+            Lock: The lock of the output directory.
+        """
+        if self.is_local_path(output_path):
+            output_path = os.path.abspath(output_path)
+        with self.output_locks_lock:
+            return self.output_locks.setdefault(output_path.rstrip('/'), threading.Lock())
+
+    def run_job(self, job):
+        """
+        Run one job of the job server with a fresh DataProcessor.
+
+        Each job gets its own session of the shared SparkContext, so the SQL settings a
+        run changes (e.g. the split size or the Bloom filter settings) do not leak into
+        concurrent jobs, while cached data and executors are shared. Jobs writing the
+        same output directory, and with it the same incremental state, run one at a time.
+
+        Args:
+            job (dict): The job record; its status, timings and error are updated in place.
+        """
+        request = job['request']
+        job['status'] = 'running'
+        job['started_at'] = datetime.now(timezone.utc).isoformat()
+        start_time = time.perf_counter()
+        try:
+            job_processor = DataProcessor(
+                lazy=request.get('lazy', False), incremental=request.get('incremental', False),
+                profile=self.profile, engine=request.get('engine', self.engine)
+            )
+            job_processor.spark = self.spark.newSession()
+            output_path = request.get('output', DEFAULT_OUTPUT_PATH)
+            with self.get_output_lock(output_path):
+                self.logger.info(f"Job {job['id']} started (run {job_processor.run_id}).")
+                job_processor.process_data(
+                    request['clients_file'], request['financials_file'], request.get('countries', []),
+                    output_path
+                )
+            job['status'] = 'succeeded'
+        except Exception as job_error:
+            job['status'] = 'failed'
+            job['error'] = str(job_error)
+            self.logger.error(f"Job {job['id']} failed: {str(job_error)}")
+        finally:
+            job['finished_at'] = datetime.now(timezone.utc).isoformat()
+            job['wall_time_seconds'] = round(time.perf_counter() - start_time, 3)
+            self.logger.info(f"Job {job['id']} {job['status']} in {job['wall_time_seconds']}s.")
+
+    def submit_job(self, server, request):
+        """
+        Validate a job request and queue it on the job server.
+
+        Args:
+            server (ThreadingHTTPServer): The job server.
+            request (dict): The job request with clients_file, financials_file and optional
+                countries, output, lazy, incremental and engine.
+
+        Returns:
+            dict: A copy of the job record at submission.
+
+        Raises:
+            ValueError: If the request is invalid.
+            RuntimeError: If the job queue is full.
+        """
+        if not isinstance(request, dict) or not request.get('clients_file') or not request.get('financials_file'):
+            raise ValueError("clients_file and financials_file are required")
+        if not isinstance(request.get('countries', []), list):
+            raise ValueError("countries must be a list")
+        if request.get('engine') is not None and request['engine'] not in SUPPORTED_ENGINES:
+            raise ValueError(f"engine must be one of {list(SUPPORTED_ENGINES)}")
+
+        with server.jobs_lock:
+            self.evict_finished_jobs(server)
+            queued_jobs = sum(1 for job in server.jobs.values() if job['status'] == 'queued')
+            if queued_jobs >= server.max_queued_jobs:
+                raise RuntimeError(f"The job queue is full ({queued_jobs} queued jobs)")
+            job = {
+                'id': uuid.uuid4().hex,
+                'status': 'queued',
+                'submitted_at': datetime.now(timezone.utc).isoformat(),
+                'request': request,
+            }
+            server.jobs[job['id']] = job
+        submitted_job = dict(job)
+        server.executor.submit(self.run_job, job)
+        self.logger.info(f"Job {job['id']} queued.")
+        return submitted_job
+
+    def evict_finished_jobs(self, server):
+        """
+        Remove finished jobs from the job server once they expire or exceed the maximum count.
+
+        Finished jobs are kept for finished_job_ttl_seconds so that clients can fetch their
+        status, and at most max_finished_jobs of them are kept, the oldest being removed
+        first. Must be called with server.jobs_lock held.
+
+        Args:
+            server (ThreadingHTTPServer): The job server.
+        """
+        now = datetime.now(timezone.utc)
+        finished_jobs = sorted(
+            (job for job in server.jobs.values() if 'finished_at' in job), key=lambda job: job['finished_at']
+        )
+        evicted_jobs = finished_jobs[:max(0, len(finished_jobs) - server.max_finished_jobs)]
+        evicted_jobs += [
+            job for job in finished_jobs[len(evicted_jobs):]
+            if (now - datetime.fromisoformat(job['finished_at'])).total_seconds() > server.finished_job_ttl_seconds
+        ]
+        for job in evicted_jobs:
+            del server.jobs[job['id']]
+        if evicted_jobs:
+            self.logger.info(f"Evicted {len(evicted_jobs)} finished jobs.")
+
+    def create_job_server(self, host=None, port=None):
+        """
+        Create the HTTP job server around a warm Spark session.
+
+        The Spark session is started once, and jobs submitted over HTTP run on a
+        thread pool of max_concurrent_jobs threads; up to max_queued_jobs wait for a
+        free thread. Finished jobs are evicted on submission by evict_finished_jobs.
+
+        Args:
+            host (str): The host to bind to, or None for the configured host.
+            port (int): The port to bind to, or None for the configured port.
+
+        Returns:
+            ThreadingHTTPServer: The job server, not yet serving.
+        """
+        server_config = self.load_server_config()
+        self.create_spark_session()
+
+        server = ThreadingHTTPServer(
+            (host or server_config['host'], server_config['port'] if port is None else port), JobRequestHandler
+        )
+        server.processor = self
+        server.jobs = {}
+        server.jobs_lock = threading.Lock()
+        server.max_queued_jobs = server_config.get('max_queued_jobs', 32)
+        server.max_finished_jobs = server_config.get('max_finished_jobs', 1000)
+        server.finished_job_ttl_seconds = server_config.get('finished_job_ttl_seconds', 3600)
+        server.executor = ThreadPoolExecutor(
+            max_workers=server_config.get('max_concurrent_jobs', 1), thread_name_prefix="job"
+        )
+        return server
+
+    def serve(self):
+        """
+        Run the job server until interrupted.
+        """
+        server = self.create_job_server()
+        host, port = server.server_address[:2]
+        self.logger.info(f"Job server listening on http://{host}:{port}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            self.logger.info("Job server stopping...")
+        finally:
+            server.server_close()
+            server.executor.shutdown(wait=True)
+
+    def fetch_status_json(self, endpoint):
+        """
+        Fetch a JSON document from the Spark status REST API.
+
+        Args:
+            endpoint (str): The endpoint relative to the current application, e.g. "jobs".
+
+        Returns:
+            The decoded JSON document, or None if the Spark UI is disabled.
+        """
+        spark_context = self.create_spark_session().sparkContext
+        if not spark_context.uiWebUrl:
+            return None
+        url = f"{spark_context.uiWebUrl}/api/v1/applications/{spark_context.applicationId}/{endpoint}"
+        with urllib.request.urlopen(url) as response:
+            return json.loads(response.read().decode('utf-8'))
+
+    def collect_stage_metrics(self, job_group):
+        """
+        Collect the Spark job, stage, row, byte, shuffle and spill metrics of a job group.
+
+        The status store behind the REST API is fed asynchronously by the listener bus, so
+        the pending events are drained first and the jobs of the group are polled until
+        they have ended, for at most metrics_timeout_seconds. The jobs of the group are
+        looked up by the status tracker, and only their stages are fetched.
+
+        Args:
+            job_group (str): The Spark job group.
+
+        Returns:
+            dict: The job and stage ids and the metrics summed over all stage attempts,
+                or None if the Spark UI is disabled.
+        """
+        spark_context = self.create_spark_session().sparkContext
+        if not spark_context.uiWebUrl:
+            return None
+
+        timeout_seconds = self.load_config('logging_config.yaml').get('metrics_timeout_seconds', 10)
+        try:
+            spark_context._jsc.sc().listenerBus().waitUntilEmpty(int(timeout_seconds * 1000))
+        except Exception as drain_error:
+            self.logger.debug(f"Could not drain the Spark listener bus: {str(drain_error)}")
+
+        status_tracker = spark_context.statusTracker()
+        deadline = time.monotonic() + timeout_seconds
+        job_ids = sorted(status_tracker.getJobIdsForGroup(job_group))
+        while time.monotonic() < deadline and not all(
+            job_info is not None and job_info.status in ('SUCCEEDED', 'FAILED')
+            for job_info in map(status_tracker.getJobInfo, job_ids)
+        ):
+            time.sleep(0.05)
+            job_ids = sorted(status_tracker.getJobIdsForGroup(job_group))
+
+        metrics = {'job_ids': [], 'stage_ids': []}
+        metrics.update({field: 0 for field in STAGE_METRIC_FIELDS})
+        for job_id in job_ids:
+            try:
+                job = self.fetch_status_json(f"jobs/{job_id}")
+            except urllib.error.HTTPError:
+                continue
+            metrics['job_ids'].append(job_id)
+            for stage_id in job.get('stageIds', []):
+                try:
+                    stage_attempts = self.fetch_status_json(f"stages/{stage_id}")
+                except urllib.error.HTTPError:
+                    continue
+                metrics['stage_ids'].append(stage_id)
+                for stage_attempt in stage_attempts:
+                    for field in STAGE_METRIC_FIELDS:
+                        metrics[field] += stage_attempt.get(field, 0)
+        return metrics
+
+    def record_stage_metrics(self, stage_name, label, started_at, wall_time, job_group):
+        """
+        Store the metrics of a stage and append them to the metrics JSON lines file.
+
+        Args:
+            stage_name (str): The name of the stage.
+            label (str): The label of the stage call, or None.
+            started_at (str): The ISO 8601 start time of the stage.
+            wall_time (float): The wall time of the stage in seconds.
+            job_group (str): The Spark job group of the stage, or None if it had no own group.
+        """
+        record = {
+            'run_id': self.run_id,
+            'stage': stage_name,
+            'label': label,
+            'started_at': started_at,
+            'wall_time_seconds': round(wall_time, 3),
+        }
+        if job_group:
+            try:
+                job_group_metrics = self.collect_stage_metrics(job_group)
+                if job_group_metrics:
+                    record.update(job_group_metrics)
+            except Exception as metrics_error:
+                self.logger.warning(f"Could not collect Spark metrics of {stage_name}: {str(metrics_error)}")
+        self.stage_metrics.append(record)
+
+        with open(self.get_metrics_path(), 'a') as metrics_file:
+            metrics_file.write(json.dumps(record) + '\n')
+
+    def get_metrics_path(self):
+        """
+        Get the path of the stage metrics JSON lines file.
+
+        Returns:
+            str: The absolute path to the metrics file.
+        """
+        config = self.load_config('logging_config.yaml')
+        return self.get_logs_path(config.get('metrics_file', 'stage_metrics.jsonl'))
+
+    def log_metrics_summary(self):
+        """
+        Log a summary table of the metrics of all stages.
+        """
+        header = f"{'Stage':<28}{'Wall (s)':>10}{'Jobs':>6}{'In rows':>12}{'Out rows':>12}{'Shuffle R':>14}{'Shuffle W':>14}{'Spill':>14}"
+        self.logger.info("Stage metrics summary:")
+        self.logger.info(header)
+        for record in self.stage_metrics:
+            stage = f"{record['stage']} ({record['label']})" if record['label'] else record['stage']
+            spill = record.get('memoryBytesSpilled', 0) + record.get('diskBytesSpilled', 0)
+            self.logger.info(
+                f"{stage:<28}{record['wall_time_seconds']:>10.3f}{len(record.get('job_ids', [])):>6}"
+                f"{record.get('inputRecords', 0):>12}{record.get('outputRecords', 0):>12}"
+                f"{record.get('shuffleReadBytes', 0):>14}{record.get('shuffleWriteBytes', 0):>14}{spill:>14}"
+            )
+
+    def run(self, args):
+        """
+        Run the pipeline selected by the parsed command-line arguments.
+
+        Args:
+            args (Namespace): The arguments parsed and validated by main.parse_arguments.
+        """
+        self.lazy = args.lazy
+        self.incremental = args.incremental
+        self.profile = args.profile
+        self.engine = args.engine
+
+        countries_to_filter = args.countries if args.countries else []
+
+        if args.serve:
+            self.serve()
+        elif args.country_groups is not None:
+            country_groups = dict(args.country_groups) or self.load_fan_out_config().get('groups', {})
+            self.process_data_fan_out(args.clients_file, args.financials_file, country_groups, args.output)
+        elif args.streaming:
+            self.process_data_streaming(args.clients_file, args.financials_file, countries_to_filter, args.output, args.checkpoint)
+        else:
+            self.process_data(args.clients_file, args.financials_file, countries_to_filter, args.output)
+
+    def main(self, argv=None):
+        """
+        Parse the command-line arguments and run the selected pipeline.
+
+        Kept for callers of processor.main(); the arguments are parsed by main.parse_arguments.
+
+        Args:
+            argv (list): The arguments, or None for sys.argv.
+        """
+        cli_module = importlib.import_module(f"{__package__}.main" if __package__ else "main")
+        self.run(cli_module.parse_arguments(argv))
+
+
+class JobRequestHandler(BaseHTTPRequestHandler):
+    """
+    HTTP handler of the job server.
+
+    Endpoints:
+        - POST /jobs: Queue a job from a JSON request; answers 202 with the job record.
+        - GET /jobs/<id>: Get the status of a job.
+        - GET /health: Check that the server is up.
+    """
+
+    def send_json(self, status, body):
+        """
+        Send a JSON response.
+
+        Args:
+            status (int): The HTTP status code.
+            body (dict): The response body.
+        """
+        payload = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_POST(self):
+        """
+        Queue a job.
+        """
+        if self.path.rstrip('/') != '/jobs':
+            self.send_json(404, {'error': f"Unknown endpoint {self.path}"})
+            return
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+            job = self.server.processor.submit_job(self.server, request)
+        except (ValueError, json.JSONDecodeError) as request_error:
+            self.send_json(400, {'error': str(request_error)})
+            return
+        except RuntimeError as queue_error:
+            self.send_json(503, {'error': str(queue_error)})
+            return
+        self.send_json(202, job)
+
+    def do_GET(self):
+        """
+        Get the status of a job or of the server.
+        """
+        path = self.path.rstrip('/')
+        if path == '/health':
+            self.send_json(200, {'status': 'ok', 'jobs': len(self.server.jobs)})
+        elif path.startswith('/jobs/') and path[len('/jobs/'):] in self.server.jobs:
+            self.send_json(200, dict(self.server.jobs[path[len('/jobs/'):]]))
+        else:
+            self.send_json(404, {'error': f"Unknown job or endpoint {self.path}"})
+
+    def log_message(self, format, *args):
+        """
+        Log requests with the DataProcessor logger instead of stderr.
+        """
+        self.server.processor.logger.debug(f"{self.address_string()} - {format % args}")
@@ -1,9 +1,18 @@
-from src.pyspark_app.main import DataProcessor
+from src.pyspark_app.main import DataProcessor, CONFIG_SCHEMAS, parse_arguments, parse_country_group
 import pyspark
 from chispa import assert_df_equality
 from pyspark.sql import SparkSession, DataFrame
 from pyspark.sql.functions import concat, col, lit
+from pyspark.sql.types import LongType
+import json
+import os
+import pytest
+import shutil
+import subprocess
 import sys
+import threading
+import time
+import urllib.request
 
 dp = DataProcessor()
 
@@ -81,3 +90,712 @@ def test_join_datasets(spark_session):
     df_transactions = spark_session.createDataFrame(data=data2_for_join, schema=columns2_for_join)
     df_expected = spark_session.createDataFrame(data=expected_data, schema=expected_columns)
     assert_df_equality(dp.dataset_join(df_users, df_transactions, 'id'), df_expected)
+
+def test_build_schema():
+    """
+    Test the build_schema method of DataProcessor.
+    """
+    schema = dp.build_schema("financials")
+    assert schema.fieldNames() == ["id", "btc_a", "cc_t", "cc_n"]
+    assert schema["cc_n"].dataType == LongType()
+    assert dp.build_schema("unknown_dataset") is None
+
+def test_get_schema_cache_path_changes_with_file(tmp_path):
+    """
+    Test that the schema cache key changes when the input file is rewritten.
+
+    :param tmp_path: A pytest temporary directory.
+    """
+    csv_path = tmp_path / "clients.csv"
+    csv_path.write_text("id,country\n1,Netherlands\n")
+    first_cache_path = dp.get_schema_cache_path(str(csv_path), "clients")
+    assert dp.get_schema_cache_path(str(csv_path), "clients") == first_cache_path
+
+    csv_path.write_text("id,country,email\n1,Netherlands,a@b.nl\n")
+    assert dp.get_schema_cache_path(str(csv_path), "clients") != first_cache_path
+
+def test_track_row_count_lazy(spark_session):
+    """
+    Test that track_row_count defers the row count to the final action in lazy mode.
+
+    :param spark_session: A PySpark SparkSession.
+    """
+    lazy_dp = DataProcessor(lazy=True)
+    observed_df = lazy_dp.track_row_count(load_dataframe(spark_session), "Test stage", "Test stage completed.")
+    observed_df.collect()
+    assert lazy_dp.stage_observations["Test stage"].get["rows"] == 10
+
+def test_save_to_file(spark_session, tmp_path):
+    """
+    Test that save_to_file writes the DataFrame and commits it to the output directory.
+
+    :param spark_session: A PySpark SparkSession.
+    :param tmp_path: A pytest temporary directory.
+    """
+    output_path = str(tmp_path / "result_data")
+    dp.save_to_file(load_dataframe(spark_session), output_path)
+    saved_df = spark_session.read.csv(output_path, header=True, inferSchema=True)
+    assert saved_df.count() == 10
+    assert os.listdir(tmp_path) == ["result_data"]
+
+def test_save_to_file_driver_export(spark_session, tmp_path, monkeypatch):
+    """
+    Test that the driver export writes Parquet and CSV outputs that read back unchanged.
+
+    :param spark_session: A PySpark SparkSession.
+    :param tmp_path: A pytest temporary directory.
+    :param monkeypatch: The pytest monkeypatch fixture.
+    """
+    pytest.importorskip("pyarrow")
+    df_expected = load_dataframe(spark_session)
+    for output_format in ["parquet", "csv"]:
+        writer_config = dict(
+            dp.load_writer_config(), output_format=output_format, partition_by=[], compression="none",
+            driver_export={"enabled": True, "max_bytes": 268435456, "chunk_rows": 3}
+        )
+        monkeypatch.setattr(dp, "load_writer_config", lambda: writer_config)
+        output_path = str(tmp_path / output_format)
+        dp.save_to_file(df_expected, output_path)
+
+        assert sorted(os.listdir(output_path)) == ["_SUCCESS", f"part-00000.{output_format}"]
+        reader = spark_session.read.schema(df_expected.schema)
+        saved_df = reader.parquet(output_path) if output_format == "parquet" else reader.csv(output_path, header=True)
+        assert_df_equality(saved_df, df_expected, ignore_row_order=True)
+
+def test_process_data_driver_export(spark_session, tmp_path, monkeypatch):
+    """
+    Test that process_data exports the joined output of small CSV inputs on the driver.
+
+    :param spark_session: A PySpark SparkSession.
+    :param tmp_path: A pytest temporary directory.
+    :param monkeypatch: The pytest monkeypatch fixture.
+    """
+    pytest.importorskip("pyarrow")
+    raw_data_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "raw_data")
+    processor = DataProcessor(engine="spark")
+    writer_config = dict(
+        processor.load_writer_config(), output_format="csv", partition_by=[], compression="none",
+        driver_export={"enabled": True, "max_bytes": 16 * 1024 * 1024, "chunk_rows": 100}
+    )
+    monkeypatch.setattr(processor, "load_writer_config", lambda: writer_config)
+    output_path = str(tmp_path / "result_data")
+    processor.process_data(
+        os.path.join(raw_data_path, "dataset_one.csv"), os.path.join(raw_data_path, "dataset_two.csv"),
+        ["Netherlands", "United Kingdom"], output_path
+    )
+
+    assert sorted(os.listdir(output_path)) == ["_SUCCESS", "part-00000.csv"]
+    assert spark_session.read.csv(output_path, header=True).count() > 0
+
+def test_choose_join_strategy(spark_session):
+    """
+    Test that choose_join_strategy broadcasts the smaller of two small datasets.
+
+    :param spark_session: A PySpark SparkSession.
+    """
+    df_users = spark_session.createDataFrame(data=[(101, "00101")], schema=["id", "attribute10"])
+    strategy, broadcast_side = dp.choose_join_strategy(df_users, load_dataframe(spark_session))
+    assert strategy == "broadcast"
+    assert broadcast_side == "clients"
+
+def test_find_hot_keys_returns_only_hot_keys(spark_session):
+    """
+    Test that find_hot_keys returns only the keys above the hot key share.
+
+    :param spark_session: A PySpark SparkSession.
+    """
+    key_rows = [(101,)] * 900 + [(key,) for key in range(1000, 2000)]
+    df_transactions = spark_session.createDataFrame(data=key_rows, schema=["id"])
+    skew_config = {'sample_fraction': 1.0, 'hot_key_min_share': 0.05}
+    assert dp.find_hot_keys(df_transactions, "id", skew_config) == [101]
+
+def test_join_with_salted_keys(spark_session):
+    """
+    Test that join_with_salted_keys returns the same rows as a plain join.
+
+    :param spark_session: A PySpark SparkSession.
+    """
+    df_users = spark_session.createDataFrame(data=[(101, "00101"), (102, "00102")], schema=["id", "attribute10"])
+    df_transactions = spark_session.createDataFrame(data=[(101, 1), (101, 2), (102, 3)], schema=["id", "attribute11"])
+    result_df = dp.join_with_salted_keys(df_users, df_transactions, [101], 4)
+    assert result_df.columns == ["id", "attribute10", "attribute11"]
+    assert sorted(tuple(row) for row in result_df.collect()) == [(101, "00101", 1), (101, "00101", 2), (102, "00102", 3)]
+
+def test_read_csv_file_pushes_country_filter(spark_session, tmp_path):
+    """
+    Test that read_csv_file applies the country filter on a partitioned Parquet input.
+
+    :param spark_session: A PySpark SparkSession.
+    :param tmp_path: A pytest temporary directory.
+    """
+    input_path = str(tmp_path / "clients.parquet")
+    clients_df = spark_session.createDataFrame(
+        data=[(1, "a@x.nl", "Netherlands"), (2, "b@x.fr", "France"), (3, "c@x.uk", "United Kingdom")],
+        schema=["id", "email", "country"]
+    )
+    clients_df.write.partitionBy("country").parquet(input_path)
+
+    result_df = dp.read_csv_file(input_path, "Clients", ["id", "email", "country"], "clients", ["Netherlands", "United Kingdom"])
+    assert sorted(row["id"] for row in result_df.collect()) == [1, 3]
+
+def test_evict_staged_files(tmp_path):
+    """
+    Test that evict_staged_files removes the least recently used staged copies first
+    and keeps the recently used ones.
+
+    :param tmp_path: A pytest temporary directory.
+    """
+    for index, name in enumerate(["old.parquet", "new.parquet"]):
+        staged_path = tmp_path / name
+        staged_path.mkdir()
+        (staged_path / "part-00000.parquet").write_bytes(b"x" * 100)
+        os.utime(staged_path, (index, index))
+
+    dp.evict_staged_files(str(tmp_path), 150)
+    assert not (tmp_path / "old.parquet").exists()
+    assert (tmp_path / "new.parquet").exists()
+
+    recent_path = tmp_path / "recent.parquet"
+    recent_path.mkdir()
+    (recent_path / "part-00000.parquet").write_bytes(b"x" * 200)
+    dp.evict_staged_files(str(tmp_path), 150, min_idle_seconds=3600)
+    assert not (tmp_path / "new.parquet").exists()
+    assert recent_path.exists()
+
+def test_hash_rows_by_id(spark_session):
+    """
+    Test that hash_rows_by_id does not depend on row order and detects changed rows,
+    including a value moving between nullable columns.
+
+    :param spark_session: A PySpark SparkSession.
+    """
+    columns = ["id", "attribute11"]
+    df_first = spark_session.createDataFrame(data=[(101, 1), (101, 2), (102, 3)], schema=columns)
+    df_reordered = spark_session.createDataFrame(data=[(102, 3), (101, 2), (101, 1)], schema=columns)
+    df_changed = spark_session.createDataFrame(data=[(101, 1), (101, 2), (102, 4)], schema=columns)
+
+    def hashes(data_df):
+        return {row["id"]: row["row_hash"] for row in dp.hash_rows_by_id(data_df, "row_hash", "|").collect()}
+
+    assert hashes(df_first) == hashes(df_reordered)
+    assert hashes(df_first)[101] == hashes(df_changed)[101]
+    assert hashes(df_first)[102] != hashes(df_changed)[102]
+
+    nullable_schema = "id long, first string, second string, third string"
+    df_null_second = spark_session.createDataFrame(data=[(101, "a", None, "b")], schema=nullable_schema)
+    df_null_third = spark_session.createDataFrame(data=[(101, "a", "b", None)], schema=nullable_schema)
+    assert hashes(df_null_second)[101] != hashes(df_null_third)[101]
+
+def test_create_spark_session_reuses_session(spark_session):
+    """
+    Test that create_spark_session creates one session per DataProcessor and rejects unknown profiles.
+
+    :param spark_session: A PySpark SparkSession.
+    """
+    assert dp.create_spark_session() is dp.create_spark_session()
+
+    unknown_profile_dp = DataProcessor(profile="unknown_profile")
+    with pytest.raises(ValueError):
+        unknown_profile_dp.create_spark_session()
+
+def test_is_local_path():
+    """
+    Test the is_local_path method of DataProcessor.
+    """
+    assert dp.is_local_path("client_data/result_data")
+    assert dp.is_local_path("F:/abn/pyspark_assignment/client_data/result_data")
+    assert dp.is_local_path("file:///tmp/result_data")
+    assert not dp.is_local_path("hdfs://namenode/client_data/result_data")
+
+def test_instrumented_stage_records_metrics(spark_session):
+    """
+    Test that instrumented stages record their wall time and Spark metrics.
+
+    :param spark_session: A PySpark SparkSession.
+    """
+    instrumented_dp = DataProcessor()
+    instrumented_dp.filter_data(load_dataframe(spark_session).withColumn("country", col("attribute1")), ["PL"])
+
+    record = instrumented_dp.stage_metrics[-1]
+    assert record["stage"] == "filter_data"
+    assert record["wall_time_seconds"] >= 0
+    if spark_session.sparkContext.uiWebUrl:
+        assert record["job_ids"]
+    assert os.path.exists(instrumented_dp.get_metrics_path())
+
+def test_rename_columns_single_projection(spark_session):
+    """
+    Test that rename_columns applies the configured renames in a single projection.
+
+    :param spark_session: A PySpark SparkSession.
+    """
+    df_joined = spark_session.createDataFrame(
+        data=[(1, "a@x.nl", "Netherlands", "1btc", "visa")],
+        schema=["id", "email", "country", "btc_a", "cc_t"]
+    )
+    result_df = dp.rename_columns(df_joined)
+    assert result_df.columns == ["client_identifier", "email", "country", "bitcoin_address", "credit_card_type"]
+    assert result_df.collect()[0]["bitcoin_address"] == "1btc"
+    assert dp.build_rename_projection(df_joined.columns) is dp.build_rename_projection(df_joined.columns)
+
+def test_load_config_is_cached_and_validated():
+    """
+    Test that load_config caches configurations and validate_config_value rejects invalid ones.
+    """
+    assert dp.load_config('column_selection_config.yaml') is dp.load_config('column_selection_config.yaml')
+
+    rename_schema = {'type': dict, 'fields': CONFIG_SCHEMAS['column_rename_config.yaml']}
+    with pytest.raises(ValueError):
+        dp.validate_config_value({'renamed_columns': [{'original_name': 'btc_a'}]}, rename_schema, 'column_rename_config.yaml')
+    with pytest.raises(ValueError):
+        dp.validate_config_value({'renamed_columns': [], 'dropped_columns': 'id'}, rename_schema, 'column_rename_config.yaml')
+
+def test_read_sources_in_parallel(spark_session, tmp_path):
+    """
+    Test that read_sources_in_parallel reads every source and records its timing.
+
+    :param spark_session: A PySpark SparkSession.
+    :param tmp_path: A pytest temporary directory.
+    """
+    sources = {}
+    for source_name in ["first", "second"]:
+        input_path = str(tmp_path / f"{source_name}.parquet")
+        load_dataframe(spark_session).write.parquet(input_path)
+        sources[source_name] = {'file_path': input_path, 'description': source_name}
+
+    parallel_dp = DataProcessor()
+    result = parallel_dp.read_sources_in_parallel(sources)
+    assert sorted(result) == ["first", "second"]
+    assert result["second"].count() == 10
+    assert sorted(parallel_dp.source_timings) == ["first", "second"]
+
+def test_read_sources_in_parallel_plans_one_split_size(spark_session, tmp_path, monkeypatch):
+    """
+    Test that read_sources_in_parallel sizes the input splits from all sources together.
+
+    :param spark_session: A PySpark SparkSession.
+    :param tmp_path: A pytest temporary directory.
+    :param monkeypatch: The pytest monkeypatch fixture.
+    """
+    small_path = tmp_path / "small.csv"
+    small_path.write_text("id,country\n1,Netherlands\n")
+    large_path = tmp_path / "large.csv"
+    large_path.write_text("id,country\n" + "".join(f"{index},United Kingdom\n" for index in range(10000)))
+
+    processor = DataProcessor()
+    ingestion_config = dict(processor.load_ingestion_config(), min_split_mb=0, max_split_mb=1024)
+    monkeypatch.setattr(processor, "load_ingestion_config", lambda: ingestion_config)
+    total_bytes = os.path.getsize(small_path) + os.path.getsize(large_path)
+    try:
+        processor.read_sources_in_parallel({
+            'small': {'file_path': str(small_path), 'description': "Small"},
+            'large': {'file_path': str(large_path), 'description': "Large"},
+        })
+        split_bytes = int(spark_session.conf.get("spark.sql.files.maxPartitionBytes"))
+        assert split_bytes == -(-total_bytes // spark_session.sparkContext.defaultParallelism)
+    finally:
+        processor.restore_session_conf()
+
+def test_resolve_input_paths(tmp_path):
+    """
+    Test that resolve_input_paths expands directories, globs and manifests, and that
+    glob wildcards do not match across directories.
+
+    :param tmp_path: A pytest temporary directory.
+    """
+    for day in ["2024-01-01", "2024-01-02"]:
+        (tmp_path / "shards" / day).mkdir(parents=True)
+        (tmp_path / "shards" / day / "clients.csv").write_text("id,email,country\n")
+        (tmp_path / "shards" / day / "_SUCCESS").write_text("")
+    (tmp_path / "clients.manifest").write_text("# daily shards\nshards/2024-01-02/clients.csv\n")
+
+    directory_files = dp.resolve_input_paths(str(tmp_path / "shards"))
+    glob_files = dp.resolve_input_paths(str(tmp_path / "shards" / "*-02" / "*.csv"))
+    manifest_files = dp.resolve_input_paths(str(tmp_path / "clients.manifest"))
+
+    assert [os.path.basename(os.path.dirname(path)) for path, _ in directory_files] == ["2024-01-01", "2024-01-02"]
+    assert [path for path, _ in glob_files] == [str(tmp_path / "shards" / "2024-01-02" / "clients.csv")]
+    assert [size for _, size in manifest_files] == [len("id,email,country\n")]
+    assert dp.resolve_input_paths(str(tmp_path / "shards")) == directory_files
+    assert not dp.match_glob(str(tmp_path / "shards" / "2024-01-01" / "clients.csv"), str(tmp_path / "shards" / "*.csv"))
+    with pytest.raises(FileNotFoundError):
+        dp.resolve_input_paths(str(tmp_path / "shards" / "*.csv"))
+
+def test_prune_join_inputs(spark_session):
+    """
+    Test that prune_join_inputs keeps only the join key and output columns, without duplicates.
+
+    :param spark_session: A PySpark SparkSession.
+    """
+    df_clients = spark_session.createDataFrame(
+        data=[(1, "Feliza", "a@x.nl", "Netherlands")], schema=["id", "first_name", "email", "country"]
+    )
+    df_financials = spark_session.createDataFrame(
+        data=[(1, "1btc", "visa", "a@x.nl", 4175006996999270)], schema=["id", "btc_a", "cc_t", "email", "cc_n"]
+    )
+    pruned_clients, pruned_financials = dp.prune_join_inputs(df_clients, df_financials)
+    assert pruned_clients.columns == ["id", "email", "country"]
+    assert pruned_financials.columns == ["id", "btc_a", "cc_t"]
+
+def test_commit_output_replaces_existing_output(spark_session, tmp_path):
+    """
+    Test that commit_output replaces an existing output and leaves no staging or previous directories.
+
+    :param spark_session: A PySpark SparkSession.
+    :param tmp_path: A pytest temporary directory.
+    """
+    output_path = str(tmp_path / "result_data")
+    for output_version in ["first", "second"]:
+        staging_path = dp.get_staging_path(output_path)
+        os.makedirs(staging_path)
+        with open(os.path.join(staging_path, "version.txt"), "w") as version_file:
+            version_file.write(output_version)
+        dp.commit_output(spark_session, staging_path, output_path)
+
+    assert os.listdir(tmp_path) == ["result_data"]
+    with open(os.path.join(output_path, "version.txt")) as version_file:
+        assert version_file.read() == "second"
+
+def test_repartition_skew_aware(spark_session, monkeypatch):
+    """
+    Test that repartition_skew_aware keeps the rows and columns of a skewed DataFrame.
+
+    :param spark_session: A PySpark SparkSession.
+    :param monkeypatch: The pytest monkeypatch fixture.
+    """
+    skewed_data = [(index, "United Kingdom" if index % 10 else "Netherlands") for index in range(1000)]
+    df_skewed = spark_session.createDataFrame(data=skewed_data, schema=["id", "country"])
+    assert dp.repartition_skew_aware(df_skewed) is df_skewed
+
+    writer_config = dict(dp.load_writer_config(), partition_by=["country"])
+    monkeypatch.setattr(dp, "load_writer_config", lambda: writer_config)
+    result_df = dp.repartition_skew_aware(df_skewed)
+    assert result_df.columns == ["id", "country"]
+    assert sorted(tuple(row) for row in result_df.collect()) == sorted(skewed_data)
+
+def test_process_data_streaming_available_now(spark_session, tmp_path, monkeypatch):
+    """
+    Test that process_data_streaming joins the files present in both directories and stops.
+
+    :param spark_session: A PySpark SparkSession.
+    :param tmp_path: A pytest temporary directory.
+    :param monkeypatch: The pytest monkeypatch fixture.
+    """
+    clients_dir = tmp_path / "clients"
+    financials_dir = tmp_path / "financials"
+    clients_dir.mkdir()
+    financials_dir.mkdir()
+    (clients_dir / "clients_1.csv").write_text(
+        "id,first_name,last_name,email,country\n"
+        "1,Feliza,Eusden,feusden0@ameblo.jp,Netherlands\n"
+        "2,Priscilla,Le Pine,plepine1@biglobe.ne.jp,France\n"
+    )
+    (financials_dir / "financials_1.csv").write_text(
+        "id,btc_a,cc_t,cc_n\n"
+        "1,1wjtPamAZeGhRnZfhBAHHHjNvnHefd2V2,visa-electron,4175006996999270\n"
+        "2,1Js9BA1rV31hJFmN25rh8HWfrrYLXAyw9T,jcb,3587679584356527\n"
+    )
+    streaming_config = dict(dp.load_streaming_config(), available_now=True)
+    monkeypatch.setattr(dp, "load_streaming_config", lambda: streaming_config)
+
+    output_path = str(tmp_path / "result_data")
+    dp.process_data_streaming(str(clients_dir), str(financials_dir), ["Netherlands"], output_path, str(tmp_path / "checkpoint"))
+
+    result_df = spark_session.read.csv(output_path, header=True)
+    assert [row.email for row in result_df.collect()] == ["feusden0@ameblo.jp"]
+
+def test_get_streaming_checkpoint_path_is_keyed_by_output(tmp_path):
+    """
+    Test that streaming queries writing different outputs get different default checkpoints.
+
+    :param tmp_path: A pytest temporary directory.
+    """
+    clients_dir = str(tmp_path / "clients")
+    financials_dir = str(tmp_path / "financials")
+    first_checkpoint = dp.get_streaming_checkpoint_path(clients_dir, financials_dir, ["Netherlands"], str(tmp_path / "first"))
+    second_checkpoint = dp.get_streaming_checkpoint_path(clients_dir, financials_dir, ["Netherlands"], str(tmp_path / "second"))
+    assert first_checkpoint != second_checkpoint
+    assert dp.get_streaming_checkpoint_path(clients_dir, financials_dir, ["Netherlands"], str(tmp_path / "first")) == first_checkpoint
+
+def test_apply_runtime_filter_prunes_financials(spark_session):
+    """
+    Test that apply_runtime_filter keeps only financial rows of the filtered client ids,
+    and prunes all of them without registering an observation when there is no client id.
+
+    :param spark_session: A PySpark SparkSession.
+    """
+    df_clients = spark_session.createDataFrame(data=[(1, "Netherlands"), (3, "United Kingdom")], schema=["id", "country"])
+    df_financials = spark_session.createDataFrame(
+        data=[(1, "1btc"), (2, "2btc"), (3, "3btc"), (4, "4btc")], schema=["id", "btc_a"]
+    )
+
+    result_df = dp.apply_runtime_filter(df_clients, df_financials)
+    assert sorted(row.id for row in result_df.collect()) == [1, 3]
+
+    filter_dp = DataProcessor()
+    result_df = filter_dp.apply_runtime_filter(df_clients.filter(col("country") == "UK"), df_financials)
+    assert result_df.collect() == []
+    assert "Runtime filter" not in filter_dp.stage_observations
+
+def test_local_engine_matches_spark_output(spark_session, tmp_path):
+    """
+    Test that the local engine writes the same CSV rows as the Spark engine.
+
+    :param spark_session: A PySpark SparkSession.
+    :param tmp_path: A pytest temporary directory.
+    """
+    raw_data_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "raw_data")
+    clients_file = os.path.join(raw_data_path, "dataset_one.csv")
+    financials_file = os.path.join(raw_data_path, "dataset_two.csv")
+
+    outputs = {}
+    for engine in ["spark", "local"]:
+        processor = DataProcessor(lazy=True, engine=engine)
+        output_path = str(tmp_path / engine)
+        processor.process_data(clients_file, financials_file, ["Netherlands", "United Kingdom"], output_path)
+        lines = []
+        for part_file in sorted(os.listdir(output_path)):
+            if part_file.startswith("part-"):
+                with open(os.path.join(output_path, part_file)) as output_file:
+                    lines.extend(output_file.read().splitlines(keepends=True))
+        outputs[engine] = lines
+
+    assert outputs["local"][0] == outputs["spark"][0]
+    assert sorted(outputs["local"][1:]) == sorted(line for line in outputs["spark"][1:] if line != outputs["spark"][0])
+    assert "_SUCCESS" in os.listdir(tmp_path / "local")
+
+def test_job_server_runs_submitted_job(spark_session, tmp_path):
+    """
+    Test that the job server runs a submitted job to completion on the warm Spark session.
+
+    :param spark_session: A PySpark SparkSession.
+    :param tmp_path: A pytest temporary directory.
+    """
+    raw_data_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "raw_data")
+    server = dp.create_job_server(port=0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    server_url = f"http://127.0.0.1:{server.server_address[1]}"
+    try:
+        job_request = {
+            "clients_file": os.path.join(raw_data_path, "dataset_one.csv"),
+            "financials_file": os.path.join(raw_data_path, "dataset_two.csv"),
+            "countries": ["Netherlands"],
+            "output": str(tmp_path / "result_data"),
+            "engine": "spark",
+        }
+        request = urllib.request.Request(f"{server_url}/jobs", data=json.dumps(job_request).encode("utf-8"), method="POST")
+        job = json.load(urllib.request.urlopen(request))
+
+        for _ in range(600):
+            job = json.load(urllib.request.urlopen(f"{server_url}/jobs/{job['id']}"))
+            if job["status"] in ("succeeded", "failed"):
+                break
+            time.sleep(0.1)
+        assert job["status"] == "succeeded"
+        assert os.path.isdir(tmp_path / "result_data")
+    finally:
+        server.shutdown()
+        server.server_close()
+        server.executor.shutdown(wait=True)
+
+def test_evict_finished_jobs(spark_session):
+    """
+    Test that the job server evicts expired finished jobs and the oldest beyond the maximum count.
+
+    :param spark_session: A PySpark SparkSession.
+    """
+    server = dp.create_job_server(port=0)
+    try:
+        server.max_finished_jobs = 2
+        server.finished_job_ttl_seconds = 3600
+        server.jobs = {
+            'expired': {'id': 'expired', 'status': 'succeeded', 'finished_at': "2000-01-01T00:00:00+00:00"},
+            'oldest': {'id': 'oldest', 'status': 'failed', 'finished_at': "2999-01-01T00:00:00+00:00"},
+            'newer': {'id': 'newer', 'status': 'succeeded', 'finished_at': "2999-01-02T00:00:00+00:00"},
+            'newest': {'id': 'newest', 'status': 'succeeded', 'finished_at': "2999-01-03T00:00:00+00:00"},
+            'running': {'id': 'running', 'status': 'running'},
+        }
+        with server.jobs_lock:
+            dp.evict_finished_jobs(server)
+        assert sorted(server.jobs) == ["newer", "newest", "running"]
+    finally:
+        server.server_close()
+        server.executor.shutdown(wait=True)
+
+def test_setup_logging_adds_handlers_once(spark_session):
+    """
+    Test that creating several DataProcessor instances does not duplicate log handlers.
+
+    :param spark_session: A PySpark SparkSession.
+    """
+    handler_count = len(dp.logger.handlers)
+    DataProcessor()
+    assert len(dp.logger.handlers) == handler_count
+
+def test_process_data_fan_out_writes_each_group(spark_session, tmp_path):
+    """
+    Test that process_data_fan_out writes one partition per country group, with overlapping groups.
+
+    :param spark_session: A PySpark SparkSession.
+    :param tmp_path: A pytest temporary directory.
+    """
+    raw_data_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "raw_data")
+    country_groups = dict(parse_country_group(entry) for entry in ["nl=Netherlands", "nl_uk=Netherlands,United Kingdom"])
+    output_path = str(tmp_path / "result_data")
+
+    dp.process_data_fan_out(
+        os.path.join(raw_data_path, "dataset_one.csv"), os.path.join(raw_data_path, "dataset_two.csv"), country_groups, output_path
+    )
+
+    result_df = spark_session.read.csv(output_path, header=True)
+    nl_countries = {row.country for row in result_df.filter(col("country_group") == "nl").collect()}
+    nl_uk_countries = {row.country for row in result_df.filter(col("country_group") == "nl_uk").collect()}
+    assert nl_countries == {"Netherlands"}
+    assert nl_uk_countries == {"Netherlands", "United Kingdom"}
+
+def test_persist_stage_and_release(spark_session):
+    """
+    Test that the joined data is persisted by the default policy, unpersisted on release and never persisted in lazy mode.
+
+    :param spark_session: A PySpark SparkSession.
+    """
+    df_joined = spark_session.createDataFrame(data=[(1, "a@x.nl", "Netherlands")], schema=["id", "email", "country"])
+
+    persisted_df = dp.persist_stage(df_joined, "joined_data")
+    assert persisted_df.storageLevel.useDisk and persisted_df.storageLevel.useMemory
+    assert dp.persist_stage(df_joined, "filtered_data") is df_joined
+
+    dp.release_persisted_data()
+    assert dp.persisted_dataframes == []
+    assert not persisted_df.storageLevel.useMemory
+    assert DataProcessor(lazy=True).persist_stage(df_joined, "joined_data") is df_joined
+
+def test_get_cached_rdd_id_matches_only_the_run_cache(spark_session):
+    """
+    Test that the cached RDD of a persisted DataFrame is found and the caches of other DataFrames are not.
+
+    :param spark_session: A PySpark SparkSession.
+    """
+    run_df = spark_session.createDataFrame(data=[(1, "a@x.nl")], schema=["id", "email"]).persist()
+    other_df = spark_session.createDataFrame(data=[(2, "b@x.uk")], schema=["id", "email"]).persist()
+    run_df.count()
+    other_df.count()
+
+    run_rdd_id = dp.get_cached_rdd_id(run_df)
+    cached_rdd_ids = [rdd_info.id() for rdd_info in spark_session.sparkContext._jsc.sc().getRDDStorageInfo()]
+    assert run_rdd_id in cached_rdd_ids
+    assert run_rdd_id != dp.get_cached_rdd_id(other_df)
+
+    run_df.unpersist()
+    other_df.unpersist()
+    assert dp.get_cached_rdd_id(run_df) is None
+
+def test_data_processor_main_parses_arguments(monkeypatch):
+    """
+    Test that DataProcessor.main parses the command-line arguments and runs the pipeline.
+
+    :param monkeypatch: The pytest monkeypatch fixture.
+    """
+    processor = DataProcessor()
+    parsed_arguments = []
+    monkeypatch.setattr(processor, "run", parsed_arguments.append)
+    processor.main(["--clients_file", "clients.csv", "--financials_file", "financials.csv", "--countries", "Netherlands"])
+    assert parsed_arguments[0].countries == ["Netherlands"]
+    assert parsed_arguments[0].output == os.path.join("client_data", "result_data")
+
+def test_parse_arguments_rejects_ignored_flag_combinations():
+    """
+    Test that parse_arguments rejects the flags ignored by the job server, the fan-out and the streaming mode.
+    """
+    inputs = ["--clients_file", "clients.csv", "--financials_file", "financials.csv"]
+    rejected_combinations = [
+        ["--serve", "--incremental"],
+        ["--serve", "--streaming"],
+        ["--serve", "--engine", "local"],
+        ["--serve", "--country_groups"],
+        inputs + ["--country_groups", "--incremental"],
+        inputs + ["--country_groups", "--streaming"],
+        inputs + ["--country_groups", "--engine", "local"],
+        inputs + ["--streaming", "--incremental"],
+        inputs + ["--streaming", "--engine", "local"],
+    ]
+    for argv in rejected_combinations:
+        with pytest.raises(SystemExit):
+            parse_arguments(argv)
+
+    assert parse_arguments(inputs + ["--country_groups", "--engine", "spark"]).engine == "spark"
+    assert parse_arguments(inputs + ["--incremental", "--engine", "local"]).incremental
+
+def test_cli_help_does_not_import_pyspark():
+    """
+    Test that main.py answers --help within the startup budget without importing pyspark or yaml.
+    """
+    main_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src", "pyspark_app", "main.py")
+    startup_budget_seconds = 1.0
+
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", main_path, "--help"], capture_output=True, text=True, timeout=60
+    )
+    assert result.returncode == 0
+    assert "--clients_file" in result.stdout
+    imported_modules = {line.split("|")[-1].strip().split(".")[0] for line in result.stderr.splitlines() if "|" in line}
+    assert "pyspark" not in imported_modules
+    assert "yaml" not in imported_modules
+    total_import_microseconds = sum(
+        int(line.split("|")[0].split(":")[1]) for line in result.stderr.splitlines()
+        if line.startswith("import time:") and line.split("|")[0].split(":")[1].strip().isdigit()
+    )
+    assert total_import_microseconds / 1e6 < startup_budget_seconds
+
+def test_process_data_incremental_end_to_end(spark_session, tmp_path):
+    """
+    Test incremental runs over a first run, a changed and a removed id, another country list and a deleted output.
+
+    :param spark_session: A PySpark SparkSession.
+    :param tmp_path: A pytest temporary directory.
+    """
+    clients_file = tmp_path / "clients.csv"
+    financials_file = tmp_path / "financials.csv"
+    output_path = str(tmp_path / "result_data")
+    processor = DataProcessor(lazy=True, incremental=True)
+
+    def run(countries, clients_rows, financials_rows):
+        clients_file.write_text("id,first_name,last_name,email,country\n" + "".join(clients_rows))
+        financials_file.write_text("id,btc_a,cc_t,cc_n\n" + "".join(financials_rows))
+        processor.process_data(str(clients_file), str(financials_file), countries, output_path)
+        output_rows = spark_session.read.csv(output_path, header=True).collect()
+        return sorted((row.client_identifier, row.bitcoin_address) for row in output_rows)
+
+    clients_rows = ["1,A,A,a@x.nl,Netherlands\n", "2,B,B,b@x.nl,Netherlands\n", "3,C,C,c@x.uk,United Kingdom\n"]
+    financials_rows = ["1,btc1,visa,1\n", "2,btc2,visa,2\n", "3,btc3,visa,3\n"]
+    assert run(["Netherlands"], clients_rows, financials_rows) == [("1", "btc1"), ("2", "btc2")]
+
+    changed_financials_rows = ["1,btc1-new,visa,1\n", "3,btc3,visa,3\n"]
+    assert run(["Netherlands"], clients_rows[:1] + clients_rows[2:], changed_financials_rows) == [("1", "btc1-new")]
+
+    assert run(["United Kingdom"], clients_rows, financials_rows) == [("3", "btc3")]
+
+    shutil.rmtree(output_path)
+    assert run(["Netherlands"], clients_rows, financials_rows) == [("1", "btc1"), ("2", "btc2")]
+
+def test_apply_runtime_filter_restores_session_conf(spark_session, monkeypatch):
+    """
+    Test that the Bloom filter settings of apply_runtime_filter are restored after the run.
+
+    :param spark_session: A PySpark SparkSession.
+    :param monkeypatch: The pytest monkeypatch fixture.
+    """
+    filter_dp = DataProcessor()
+    join_config = dict(filter_dp.load_join_config())
+    join_config['runtime_filter'] = dict(join_config['runtime_filter'], max_id_set_size=0)
+    monkeypatch.setattr(filter_dp, "load_join_config", lambda: join_config)
+    df_clients = spark_session.createDataFrame(data=[(1, "Netherlands")], schema=["id", "country"])
+    df_financials = spark_session.createDataFrame(data=[(1, "1btc")], schema=["id", "btc_a"])
+    original_value = spark_session.conf.get("spark.sql.optimizer.runtime.bloomFilter.numBits", None)
+
+    filter_dp.apply_runtime_filter(df_clients, df_financials).collect()
+    assert spark_session.conf.get("spark.sql.optimizer.runtime.bloomFilter.enabled") == "true"
+    assert filter_dp.stage_observations["Runtime filter"].get["rows"] == 1
+
+    filter_dp.restore_session_conf()
+    assert spark_session.conf.get("spark.sql.optimizer.runtime.bloomFilter.numBits", None) == original_value